@@ -0,0 +1,78 @@
+# Copyright (C) 2023 Morten Eek
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import time
+from pathlib import Path
+
+import blake3
+from utils import _file
+import gui
+
+SIZES = {"10MB": 10 * 1024**2, "1GB": 1024**3, "10GB": 10 * 1024**3}
+
+
+def make_file(path, size, blocksize=64 * 1024 * 1024):
+    if path.is_file() and path.stat().st_size == size:
+        return
+
+    block = os.urandom(blocksize)
+    with open(path, "wb") as f:
+        for _ in range(size // blocksize):
+            f.write(block)
+        f.write(block[:size % blocksize])
+
+
+def read_checksum(filename, blocksize=65536):
+    """Previous implementation: single threaded 64 KB reads"""
+    hash = blake3.blake3()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(blocksize), b""):
+            hash.update(block)
+    return hash.hexdigest()
+
+
+def timed(func, path):
+    start = time.perf_counter()
+    checksum = func(path)
+    return checksum, time.perf_counter() - start
+
+
+def run(main_cfg):
+    """
+    Run from cli like this:
+    On Linux: ./pwcode script --path scripts/bench_checksum.py
+    Test files are written to tmp directory of pwcode (needs about 11 GB free space) and deleted afterwards.
+    """
+
+    bench_dir = Path(main_cfg.tmp_dir, "bench_checksum")
+    bench_dir.mkdir(parents=True, exist_ok=True)
+
+    for name, size in SIZES.items():
+        path = Path(bench_dir, name + ".bin")
+        gui.print_msg("Writing " + name + " test file...", style=gui.style.info)
+        make_file(path, size)
+
+        old_checksum, old_time = timed(read_checksum, path)
+        new_checksum, new_time = timed(_file.get_checksum, path)
+        if old_checksum != new_checksum:
+            gui.print_msg("Checksums differ for " + name + "!", exit=True)
+
+        print(f"{name:>5}: 64 KB reads {old_time:8.2f}s ({size / old_time / 1024**2:8.0f} MB/s)"
+              f" | get_checksum {new_time:8.2f}s ({size / new_time / 1024**2:8.0f} MB/s)"
+              f" | speedup {old_time / new_time:5.1f}x")
+        path.unlink()
+
+    bench_dir.rmdir()
@@ -22,6 +22,7 @@ from rich.traceback import install
 from rich_argparse import RawTextRichHelpFormatter
 import gui
 import config
+import db
 from utils import _java
 import _copy
 import _archive
@@ -80,6 +81,31 @@ def get_args(argv):
             help="Stop after generating <" + ",".join(files) +
             ">-file and open for editing (triggers regeneration if rerun).",
         )
+        common_parser.add_argument(
+            "--sample",
+            dest="sample",
+            metavar="ROWS",
+            type=int,
+            default=10000,
+            help="Profile columns on a sample of ROWS rows per table (default 10000, 0 profiles all rows). "
+            "Constraints are only tightened for tables with all rows profiled.",
+        )
+        common_parser.add_argument(
+            "--tar-volume-size",
+            dest="tar_volume_size",
+            metavar="MB",
+            type=int,
+            help="Split tar-files of copied directories in volumes of max MB megabytes (created in parallel).",
+        )
+        dialects = ["iso", "oracle", "postgresql", "mssql", "mysql", "sqlite"]
+        common_parser.add_argument(
+            "--ddl-dialects",
+            dest="ddl_dialects",
+            metavar="DIALECT",
+            nargs="+",
+            choices=dialects,
+            help="Also generate DDL for <" + ",".join(dialects) + "> (in the same pass as DDL for target).",
+        )
         common_parser.add_argument("--debug", dest="debug", action="store_true", help="Show debug messages.")
         common_parser.add_argument(
             "--test",
@@ -88,6 +114,28 @@ def get_args(argv):
             help="Test run. Copied data are subsequently deleted and empty target tables are always recreated.",
         )
 
+    if argv[1] == "archive":
+        common_parser.add_argument(
+            "--jobs",
+            dest="jobs",
+            metavar="N",
+            type=int,
+            help="Number of tables to export in parallel (defaults to number of cpus, max 8).",
+        )
+        common_parser.add_argument(
+            "--compression",
+            dest="compression",
+            choices=["gzip", "zstd"],
+            help="Compress tsv-files while exporting (zstd requires the zstandard package).",
+        )
+        common_parser.add_argument(
+            "--compression-level",
+            dest="compression_level",
+            metavar="LEVEL",
+            type=int,
+            help="Compression level (defaults to 6 for gzip and 3 for zstd).",
+        )
+
     # TODO: Hide for now because of bugs in export to tsv code when used
     # if argv[1] == "archive":
     #     common_parser.add_argument(
@@ -225,16 +273,19 @@ def get_args(argv):
     sql_parser._optionals.title = "Optional"
     sql_parser._action_groups.reverse()
 
-    args = ensure_args_attr(["stop", "debug", "test", "source", "target", "path", "file", "no_blobs", "schema"],
+    args = ensure_args_attr(["stop", "debug", "test", "source", "target", "path", "file", "no_blobs", "schema",
+                             "sample", "ddl_dialects", "jobs",
+                             "compression", "compression_level", "tar_volume_size"],
                             parser.parse_args())
 
     cfg_file = Path(Path(__file__).resolve().parents[1], "config.yml")
     if not Path(cfg_file).is_file():
         shutil.copy(Path(cfg_file.parent, "config.template.yml"), cfg_file)
 
-    login_alias, jdbc_drivers, jar_files = config.load(cfg_file)
+    login_alias, jdbc_drivers, jar_files, type_rules = config.load(cfg_file)
+    db.update_types(type_rules)
 
-    return config.Main(
+    main_cfg = config.Main(
         cfg_file=cfg_file,
         command=args.command,
         args=" ".join(argv[1:]),
@@ -244,6 +295,8 @@ def get_args(argv):
         stop=args.stop,
         no_blobs=args.no_blobs,
         schema=args.schema,
+        sample=args.sample or 0,
+        ddl_dialects=args.ddl_dialects or [],
         test=args.test,
         source=args.source,
         target=args.target,
@@ -251,6 +304,17 @@ def get_args(argv):
         jdbc_drivers=jdbc_drivers,
         jar_files=jar_files,
     )
+    if args.jobs:
+        main_cfg.jobs = max(1, args.jobs)
+    if args.tar_volume_size:
+        main_cfg.tar_volume_size = max(1, args.tar_volume_size)
+    if args.compression_level is not None and not args.compression:
+        gui.print_msg("--compression-level requires --compression. Aborted.", exit=True)
+    if args.compression:
+        main_cfg.compression = args.compression
+        main_cfg.compression_level = args.compression_level
+
+    return main_cfg
 
 
 # --> ikke ta vare på gamle filer->de skal inn i subversion som første commit før konvertering heller
@@ -17,23 +17,27 @@ from pathlib import Path
 from collections import OrderedDict
 import operator
 import os
-import sys
 import json
 import shutil
-import csv
-import fileinput
-
+import io
+import gzip
+import importlib.util
+import sqlite3
+import multiprocessing
+from decimal import Decimal
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import blake3
 from command_runner import command_runner
 from rich.prompt import Confirm
 import configdb
-from utils import _file
-from frictionless import Package, validate
-import petl as etl
-import sqlwb
+from utils import _tar
 import dp
 import gui
-import jdbc
 import config
+import validator
+import fkcheck
 
 
 def get_sources(main_cfg):
@@ -53,18 +57,25 @@ def get_sources(main_cfg):
 
             if pth.name == "documents":
                 for files_pth in pth.iterdir():
-                    if (files_pth.is_dir()
-                            and any(files_pth.iterdir()) is True) or files_pth.suffix[1:].lower() == "tar":
-                        sources[files_pth] = "dir" if files_pth.suffix == "" else files_pth.suffix[1:]
+                    if files_pth.suffix[1:].lower() == "tar":
+                        sources[_tar.get_volume_set_path(files_pth)] = "tar"  # Volumes of a set as one source
+                    elif files_pth.is_dir() and any(files_pth.iterdir()) is True:
+                        sources[files_pth] = "dir"
             else:
                 sources[db_path] = db_path.suffix[1:]
 
-    # Remove any tar source for extracted tar:
-    for source in [x for x in sources if "dir" in sources[x]]:
-        if source.name in [x.with_suffix("").name for x in sources if "tar" in sources[x]]:
-            tar_path = Path(source.parent, source.name + ".tar")
-            tar_path.unlink()
+    # Remove tar source when completely extracted, else directory extracted so far (finished from tar):
+    for dir_path in [x for x in sources if "dir" in sources[x]]:
+        tar_path = Path(dir_path.parent, dir_path.name + ".tar")
+        if tar_path not in sources:
+            continue
+
+        if configdb.get_tar_status(Path(source), tar_path) == "extracted":
+            for volume_path in _tar.get_volume_paths(tar_path):
+                volume_path.unlink()
             sources.pop(tar_path)
+        else:
+            sources.pop(dir_path)
 
     return OrderedDict(sorted(sources.items(), key=operator.itemgetter(1)))  # Ordered by type
 
@@ -104,100 +115,241 @@ def get_archive_cfg(source, main_cfg):
     return cfg
 
 
-def export_file_column(dbo, table, file_column, cfg):
-    documents_dir = Path(cfg.source.parent, "documents")
-    documents_dir.mkdir(parents=True, exist_ok=True)
-    data = dbo.query("SELECT rowid, " + file_column + " FROM " + table.name)
-
-    for rowid, lob in data:
-        file_path = Path(documents_dir, table.name + "_" + file_column + rowid + ".data")
-        with open(file_path, "wb") as f:
-            f.write(lob)
-
-
-def export_text_columns(dbo, table, text_columns, tsv_path, cfg):
-    # Use version in sqlwb.py for now because of performance issues (too slow and runs out of memory on big tables)
-    def _fix_text(val):
-        repls = {"\t": " ", "\n": "", "\r": ""}  # Replace tabs and linebreaks
-        for key in repls:
-            val = val.replace(key, repls[key])
-        return val
-
-    data = dbo.query("SELECT " + ",".join(text_columns.values()) + " FROM " + table.name)
-    df = etl.convert([text_columns.keys(), *data], tuple(text_columns.keys()), _fix_text)
-    etl.tocsv(df, tsv_path, delimiter="\t", skipinitialspace=True, quoting=csv.QUOTE_NONE, quotechar="", escapechar="")
-
-
-def validate_tables(deps_list, table_deps, archived_tables, cfg):
-    validated_tables = configdb.get_validated_tables(cfg)
-    deps_list = list(set(deps_list))
-    for table in deps_list:
-        if [table] == table_deps[table]:
-            for tbl_list in {k: v for k, v in table_deps.items() if k not in archived_tables}.values():
-                if table in tbl_list:
-                    deps_list.remove(table)  # table will be validated later, avoid doing it multiple times
-                    break
-
-    if len(deps_list) == 0 or all(item in validated_tables for item in deps_list):
-        return 0, validated_tables, deps_list
-
-    gui.print_msg("Validating dependent tables against datapackage schema...", style=gui.style.info)
+def get_file_name(table, file_column, rowid):
+    return table.name + "_" + file_column + str(rowid) + ".data"
+
+
+def write_lob_file(db_path, table, file_column, rowid, documents_dir, local, conns, chunk_size=1024 * 1024):
+    """
+    Stream one lob to file in chunks, computing size and checksum in the same pass
+    """
+    if not hasattr(local, "conn"):  # One connection per writer thread, closed by caller
+        local.conn = sqlite3.connect("file:" + str(db_path) + "?mode=ro", uri=True, check_same_thread=False)
+        conns.append(local.conn)
+
+    file_name = get_file_name(table, file_column, rowid)
+    checksum = blake3.blake3()
+    size = 0
+    with local.conn.blobopen(table.name, file_column, rowid, readonly=True) as blob, open(
+            Path(documents_dir, file_name), "wb") as f:
+        for chunk in iter(lambda: blob.read(chunk_size), b""):
+            checksum.update(chunk)
+            f.write(chunk)
+            size += len(chunk)
+
+    return {
+        "file_name": file_name,
+        "source_table": table.name,
+        "source_column": file_column,
+        "source_rowid": rowid,
+        "size": size,
+        "checksum": checksum.hexdigest(),
+    }
 
-    schema_path = Path(cfg.source.parent, "partial_datapackage.json")
-    report = validate(dp.create_schema(cfg, True, tables=deps_list, schema_path=schema_path))
-    if report.valid is False:
-        gui.show(cfg, report, exit=True, error=True)
 
-    for table in deps_list:
-        cfg.config_db["tables"].update(table, {"validated": 1})
+def export_file_column(table, file_column, cfg, batch_size=1000):
+    """
+    Export lobs in column as separate files on parallel writers and record them in manifest batch by batch
+    """
+    documents_dir = Path(cfg.source.parent, "documents")
+    documents_dir.mkdir(parents=True, exist_ok=True)
+    local = threading.local()
+    conns = []
+
+    conn = sqlite3.connect("file:" + str(cfg.source) + "?mode=ro", uri=True)
+    try:
+        sql = ('SELECT rowid FROM "' + table.name + '" WHERE typeof("' + file_column + '") IN (\'blob\', \'text\')')
+        rows = conn.execute(sql)
+        with ThreadPoolExecutor(max_workers=cfg.jobs) as executor:
+            while rowids := [row[0] for row in rows.fetchmany(batch_size)]:
+                files = list(
+                    executor.map(
+                        lambda rowid: write_lob_file(cfg.source, table, file_column, rowid, documents_dir, local,
+                                                     conns), rowids))
+
+                with cfg.config_db.conn:  # Write manifest of batch in one transaction
+                    cfg.config_db["lob_files"].upsert_all(files, pk="file_name")
+    finally:
+        conn.close()
+        for writer_conn in conns:
+            writer_conn.close()
+
+
+TSV_TRANS = str.maketrans({"\n": " ", "\r": " ", "\t": " ", "\x00": " "})  # As replaceExpression in WbExport
+
+
+def tsv_value(value):
+    """
+    Convert a database value to a tsv field (null is written as an empty string)
+    """
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value.replace("\r\n", " ").translate(TSV_TRANS).strip()
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, Decimal):
+        return format(value, "f")
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex()
+
+    return str(value).translate(TSV_TRANS).strip()
+
+
+# Compression of tsv-files to file suffix and datapackage compression value:
+COMPRESSIONS = {
+    "gzip": ".gz",
+    "zstd": ".zst",
+}
+
+
+def get_tsv_path(data_dir, table_name, compression=None):
+    return Path(data_dir, table_name + ".tsv" + COMPRESSIONS.get(compression, ""))
+
+
+def get_resource_file(tsv_path, cfg):
+    """
+    Resource properties for published tsv-file. Frictionless only knows gz and zip compression,
+    so zstd compressed files are described by path extension only.
+    """
+    return {
+        "path": str(tsv_path.relative_to(cfg.source.parent)),
+        "compression": "gz" if cfg.compression == "gzip" else None,
+    }
 
-    idx = 0
-    deps_list = []
 
-    if schema_path.is_file():
-        schema_path.unlink()
+def open_tsv(path, compression=None, level=None):
+    """
+    Open tsv-file for streaming text output, compressed while written if compression is set
+    """
+    if compression == "gzip":
+        return gzip.open(path, "wt", compresslevel=6 if level is None else level, encoding="utf-8", newline="\n")
+
+    if compression == "zstd":
+        import zstandard  # Optional dependency, only needed for zstd
+        compressor = zstandard.ZstdCompressor(level=3 if level is None else level)
+        writer = compressor.stream_writer(open(path, "wb"), closefd=True)
+        return io.TextIOWrapper(io.BufferedWriter(writer, buffer_size=1024 * 1024), encoding="utf-8", newline="\n")
+
+    return open(path, "w", encoding="utf-8", newline="\n", buffering=1024 * 1024)
+
+
+def export_text_columns(rows, columns, tsv_path, table_validator=None, compression=None, level=None,
+                        batch_size=10000):
+    """
+    Stream rows to tsv-file in one pass, skipping empty rows. Returns number of rows written.
+    """
+    row_count = 0
+    lines = []
+    part_path = Path(str(tsv_path) + ".part")  # Renamed when complete so a partial file is never taken as exported
+    with open_tsv(part_path, compression, level) as f:
+        f.write("\t".join(columns) + "\n")
+        for row in rows:
+            values = [tsv_value(value) for value in row]
+            if not any(values):  # Empty row
+                continue
+
+            lines.append("\t".join(values) + "\n")
+            row_count += 1
+            if table_validator:
+                table_validator.add_row(values)
+            if len(lines) == batch_size:
+                f.writelines(lines)
+                lines = []
+
+        f.writelines(lines)
+
+    os.replace(part_path, tsv_path)
+    return row_count
+
+
+def export_table(db_path, select, columns, tsv_path, spec, compression=None, level=None):
+    """
+    Export and validate one table (runs in a worker process with its own read only connection)
+    """
+    conn = sqlite3.connect("file:" + str(db_path) + "?mode=ro", uri=True)
+    conn.text_factory = lambda b: b.decode("utf-8", "replace")
+    table_validator = validator.TableValidator(spec)
+    try:
+        rows = conn.execute(select.rstrip().rstrip(";"))
+        row_count = export_text_columns(rows, columns, tsv_path, table_validator, compression, level)
+    finally:
+        conn.close()
+
+    return row_count, table_validator.close()
+
+
+def get_dependents(package):
+    """
+    Get tables whose foreign keys can be checked when table is exported, and the tables each check needs
+    """
+    names = {resource.name for resource in package.resources}
+    groups = {}
+    dependents = {name: set() for name in names}
+    for resource in package.resources:
+        refs = {fk["reference"]["resource"] or resource.name for fk in resource.schema.foreign_keys}
+        groups[resource.name] = {resource.name} | (refs & names)  # Missing referenced table reported by check
+        for name in groups[resource.name]:
+            dependents[name].add(resource.name)
+
+    return groups, dependents
+
+
+def update_resources(schema_path, updates):
+    """
+    Update resource properties in datapackage.json (None removes property)
+    """
+    with open(schema_path) as f:
+        descriptor = json.load(f)
+
+    for resource in descriptor["resources"]:
+        for key, value in updates.get(resource["name"], {}).items():
+            if value is None:
+                resource.pop(key, None)
+            else:
+                resource[key] = value
 
-    return idx, validated_tables.extend(deps_list), deps_list
+    dp.write_package(schema_path, {key: value for key, value in descriptor.items() if key != "resources"},
+                     descriptor["resources"])
 
 
 def ensure_config_db(db_path, schema_path):
     config_db = configdb.create_db(db_path)
 
     if config_db["tables"].count == 0:
-        with open(schema_path) as f:
-            package = Package(json.load(f))
-            deps_order = 0
-            for table in package.resources:
-                deps_order += 1
-                config_db["tables"].insert(
+        package = dp.get_package(schema_path)
+        deps_order = 0
+        for table in package.resources:
+            deps_order += 1
+            config_db["tables"].insert(
+                {
+                    "source_name": table.custom["db_table_name"],
+                    "norm_name": table.name,
+                    "source_row_count": table.custom["count_of_rows"],
+                    "source_pk": ",".join(table.schema.primary_key),
+                    "deps": table.custom["db_table_deps"],
+                    "deps_order": deps_order,
+                    "include": 1,
+                    "created": 1,
+                },
+                pk="source_name",
+            )
+
+            col_pos = 0
+            for field in table.schema.fields:
+                col_pos += 1
+                config_db["columns"].insert(
                     {
-                        "source_name": table.custom["db_table_name"],
-                        "norm_name": table.name,
-                        "source_row_count": table.custom["count_of_rows"],
-                        "source_pk": ",".join(table.schema.primary_key),
-                        "deps": table.custom["db_table_deps"],
-                        "deps_order": deps_order,
-                        "include": 1,
-                        "created": 1,
+                        "tbl_col_pos": table.custom["db_table_name"] + "*" + str(col_pos),
+                        "source_table": table.custom["db_table_name"],
+                        "source_column": field.custom["db_column_name"],
+                        "norm_column": field.name,
+                        "jdbc_data_type": int(field.custom["jdbc_type"]),
+                        "source_column_position": col_pos,
                     },
-                    pk="source_name",
+                    pk="tbl_col_pos",
                 )
 
-                col_pos = 0
-                for field in table.schema.fields:
-                    col_pos += 1
-                    config_db["columns"].insert(
-                        {
-                            "tbl_col_pos": table.custom["db_table_name"] + "*" + str(col_pos),
-                            "source_table": table.custom["db_table_name"],
-                            "source_column": field.custom["db_column_name"],
-                            "norm_column": field.name,
-                            "jdbc_data_type": int(field.custom["jdbc_type"]),
-                            "source_column_position": col_pos,
-                        },
-                        pk="tbl_col_pos",
-                    )
-
         for row in config_db["tables"].rows:  # Update normalized key columns to source
             norm_pk_list = row["source_pk"].split(",")
             source_pk_list = []
@@ -223,87 +375,147 @@ def archive_db(source, main_cfg):
     if "--no-blobs" in sub_system.args:
         export_blobs = False
 
+    if cfg.compression == "zstd" and importlib.util.find_spec("zstandard") is None:
+        gui.print_msg("Compression with zstd requires the zstandard package. Aborted.", exit=True)
+
     gui.print_msg("Exporting '" + cfg.source.name + "' to tsv-files:", style=gui.style.info)
 
     changed = False
     data_dir = Path(cfg.source.parent, "data")
     data_dir.mkdir(parents=True, exist_ok=True)
-    dbo = jdbc.get_conn("jdbc:sqlite:" + str(cfg.source), cfg)
-    validated_tables = configdb.get_validated_tables(cfg)
-    table_deps = configdb.get_tables_deps(cfg)
-    archived_tables = []
-    deps_list = []
-
-    with open(cfg.schema_path) as f:
-        package = Package(json.load(f))
-        idx = 0
-        for table in package.resources:
-            tsv_path = Path(data_dir, table.name + ".tsv")
-
-            if tsv_path.is_file():
-                if tsv_path.stat().st_size == 0:
-                    tsv_path.unlink()
-                else:
-                    gui.print_msg("'" + table.path + "' already exported.", style=gui.style.info, highlight=True)
-                    archived_tables.append(table.custom["db_table_name"])
-                    continue
-            else:
-                cfg.config_db["tables"].update(table.custom["db_table_name"], {"validated": 0})
-
-            gui.print_msg(
-                "Writing '" + table.path + "' (" + table.custom["count_of_rows"] + " rows)...",
-                style=gui.style.info,
-                highlight=True,
-            )
 
-            file_columns = []
-            text_columns = {}
-            changed = True
-            for field in table.schema.fields:
-                jdbc_data_type = field.custom["jdbc_type"]
-
-                max_length = 0
-                if "maxLength" in field.constraints.keys():
-                    max_length = field.constraints["maxLength"]
-
-                # Check for blobs and big clobs that should be exported as separate files
-                if (export_blobs
-                        and jdbc_data_type in [-4, -3, -2, 2004]) or (jdbc_data_type in [-16, -1, 2005, 2009, 2011]
-                                                                      and max_length > 4000):
-                    file_columns.append(field.name)
-                    text_columns[field.name] = ("(SELECT " + table.name + "_" + field.name + " || rowid || .data AS " +
-                                                field.name + ")")
-                else:
-                    text_columns[field.name] = field.name
-
-            fix_table(dbo, table, text_columns, cfg)
-            select = dp.get_source_query(table, text_columns, cfg)
-            result = sqlwb.export_text_columns(dbo, select, text_columns, tsv_path, cfg)
-
-            if str(result) == "Error":
-                if tsv_path.is_file():
-                    tsv_path.unlink()
-
-                gui.print_msg(str(result), exit=True)
-
-            tsv_row_count = tsv_fix(tsv_path)
-            db_row_count = int(table.custom["count_of_rows"])
-            if db_row_count > tsv_row_count:
-                empty_rows = str(db_row_count - tsv_row_count)
-                cfg.config_db["tables"].update(table.custom["db_table_name"], {"empty_rows": empty_rows})
-                dp.create_schema(cfg, True)  # Update schema file row count to account for empty rows
-
-            for file_column in file_columns:
-                export_file_column(dbo, table, file_column, cfg)
-
-            idx += 1
-            archived_tables.append(table.custom["db_table_name"])
-            deps_list.extend(table.custom["db_table_deps"].split(","))
-            if all(item in archived_tables for item in deps_list) and idx > 10:
-                idx, validated_tables, deps_list = validate_tables(deps_list, table_deps, archived_tables, cfg)
-
-        if len(deps_list) > 0:
-            validate_tables(deps_list, table_deps, archived_tables, cfg)
+    package = dp.get_package(cfg.schema_path)
+    resources = {resource.name: resource for resource in package.resources}
+    keys_dir = validator.get_keys_dir(cfg.tmp_dir, cfg.source)
+    groups, dependents = get_dependents(package)
+    validated = {row["source_name"] for row in cfg.config_db["tables"].rows_where("validated = 1")}
+    unchecked = {name for name, resource in resources.items() if resource.custom["db_table_name"] not in validated}
+    archived = set()
+    planned = []
+    updates = {}  # Resource properties per table, written to datapackage.json once
+    for table in package.resources:
+        tsv_path = get_tsv_path(data_dir, table.name, cfg.compression)
+        spec = validator.get_table_spec(package, table, keys_dir)
+
+        if tsv_path.is_file() and not spec.keys_path.is_file():  # Key store needed for validation
+            tsv_path.unlink()
+
+        if tsv_path.is_file():
+            if tsv_path.stat().st_size == 0:
+                tsv_path.unlink()
+            else:
+                gui.print_msg("'" + table.path + "' already exported.", style=gui.style.info, highlight=True)
+                row = cfg.config_db["tables"].get(table.custom["db_table_name"])
+                row_count = str(int(row["source_row_count"]) - int(row["empty_rows"] or 0))
+                resource = get_resource_file(tsv_path, cfg) | {"count_of_rows": row_count}
+                if any(table.custom.get(key) != value for key, value in resource.items()):  # Not saved by abort
+                    updates[table.name] = resource
+                archived.add(table.name)
+                continue
+
+        cfg.config_db["tables"].update(table.custom["db_table_name"], {"validated": 0})
+        unchecked.update(dependents[table.name])  # Checked again against new keys
+
+        file_columns = []
+        text_columns = {}
+        changed = True
+        for field in table.schema.fields:
+            jdbc_data_type = int(field.custom["jdbc_type"])
+
+            max_length = 0
+            if "maxLength" in field.constraints.keys():
+                max_length = field.constraints["maxLength"]
+
+            # Check for blobs and big clobs that should be exported as separate files
+            if (export_blobs
+                    and jdbc_data_type in [-4, -3, -2, 2004]) or (jdbc_data_type in [-16, -1, 2005, 2009, 2011]
+                                                                  and max_length > 4000):
+                file_columns.append(field.name)
+                text_columns[field.name] = ("CASE WHEN " + field.name + " IS NULL THEN NULL ELSE '" + table.name +
+                                            "_" + field.name + "' || rowid || '.data' END")
+            else:
+                text_columns[field.name] = field.name
+
+        # Before any export starts, as a write would wait for read transactions of export workers:
+        fix_table(cfg.source, table, [x for x in text_columns if x not in file_columns])
+        select = dp.get_source_query(table, text_columns, cfg)
+        planned.append((table, tsv_path, spec, select, list(text_columns.keys()), file_columns))
+
+    exports = {}
+    checks = {}
+    try:
+        with ProcessPoolExecutor(max_workers=cfg.jobs, mp_context=multiprocessing.get_context("spawn")) as executor:
+
+            def submit_checks(names):  # Foreign keys of table are checked as soon as its dependency group is exported
+                for name in sorted(names & unchecked):
+                    if groups[name] <= archived:
+                        unchecked.remove(name)
+                        if resources[name].schema.foreign_keys:
+                            checks[executor.submit(fkcheck.check_table, resources[name], keys_dir)] = resources[name]
+                        else:  # Fields, types and primary keys are validated on export
+                            cfg.config_db["tables"].update(resources[name].custom["db_table_name"], {"validated": 1})
+
+            for table, tsv_path, spec, select, columns, file_columns in planned:
+                gui.print_msg(
+                    "Writing '" + table.path + "' (" + table.custom["count_of_rows"] + " rows)...",
+                    style=gui.style.info,
+                    highlight=True,
+                )
+                future = executor.submit(export_table, cfg.source, select, columns, tsv_path, spec, cfg.compression,
+                                         cfg.compression_level)
+                exports[future] = (table, tsv_path, file_columns)
+
+            submit_checks(set(unchecked))  # Groups exported on earlier runs
+            while exports or checks:
+                done, _ = wait(list(exports) + list(checks), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in checks:
+                        resource = checks.pop(future)
+                        errors = future.result()
+                        if errors:
+                            executor.shutdown(cancel_futures=True)
+                            gui.show(cfg, errors, exit=True, error=True)
+
+                        cfg.config_db["tables"].update(resource.custom["db_table_name"], {"validated": 1})
+                        gui.print_msg("Foreign keys of '" + resource.path + "' checked.",
+                                      style=gui.style.info,
+                                      highlight=True)
+                        continue
+
+                    table, tsv_path, file_columns = exports.pop(future)
+                    try:
+                        tsv_row_count, errors = future.result()
+                    except Exception as e:
+                        executor.shutdown(cancel_futures=True)
+                        Path(str(tsv_path) + ".part").unlink(missing_ok=True)
+
+                        gui.print_msg(str(e), exit=True)
+
+                    if errors:
+                        executor.shutdown(cancel_futures=True)
+                        tsv_path.unlink()  # Exported again on rerun
+                        gui.show(cfg, errors, exit=True, error=True)
+
+                    resource = get_resource_file(tsv_path, cfg)
+                    db_row_count = int(table.custom["count_of_rows"])
+                    if db_row_count > tsv_row_count:
+                        empty_rows = str(db_row_count - tsv_row_count)
+                        cfg.config_db["tables"].update(table.custom["db_table_name"], {"empty_rows": empty_rows})
+                        resource["count_of_rows"] = str(tsv_row_count)
+
+                    updates[table.name] = resource
+
+                    for file_column in file_columns:
+                        export_file_column(table, file_column, cfg)
+
+                    gui.print_msg("'" + table.path + "' exported (" + str(tsv_row_count) + " rows).",
+                                  style=gui.style.info,
+                                  highlight=True)
+                    archived.add(table.name)
+                    submit_checks(dependents[table.name])
+    finally:  # Also on abort, so datapackage.json matches the tsv-files written
+        if updates:
+            update_resources(cfg.schema_path, updates)
 
     if changed:
         gui.print_msg("Datapackage validated!", style=gui.style.ok)
@@ -311,29 +523,35 @@ def archive_db(source, main_cfg):
         gui.print_msg("Datapackage already validated.", style=gui.style.info)
 
 
-def fix_table(dbo, table, text_columns, cfg):
-    print("Removing any null bytes before exporting data...")
-
-    for text_column in text_columns.keys():
-        sql = ("UPDATE " + table.name + " SET " + text_column + " = substr(" + text_column + ",1,instr (" +
-               text_column + ",CHAR(0)) - 1) || substr(CAST(" + text_column + " AS BLOB),instr (" + text_column +
-               ",CHAR(0)) + 1)")
-
-        dbo.execute(sql)
-        dbo.commit()
-
-
-def tsv_fix(tsv_path):
-    print("Removing any empty lines...")
-
-    tsv_row_count = 0
-    with fileinput.input(tsv_path, inplace=True) as f:
-        for line in f:
-            if len(line.replace("\t", "")) > 1:
-                tsv_row_count += 1
-                sys.stdout.write(line)
-
-    return tsv_row_count
+def fix_table(db_path, table, columns, batch_size=10000):
+    """
+    Remove null bytes from text columns, rewriting only columns and rows that contain any
+    """
+    if not columns:
+        return
+
+    quoted = ['"' + column + '"' for column in columns]
+    has_null = ["typeof(" + column + ") = 'text' AND instr(" + column + ", char(0)) > 0" for column in quoted]
+    conn = sqlite3.connect(db_path)
+    try:
+        found = conn.execute("SELECT " + ", ".join("max(" + x + ")" for x in has_null) + ' FROM "' + table.name +
+                             '"').fetchone()  # One scan for all columns
+        fix_columns = [column for column, value in zip(quoted, found) if value]
+        if fix_columns:
+            print("Removing null bytes from " + ", ".join(fix_columns) + "...")
+            where = " OR ".join(has_null[quoted.index(column)] for column in fix_columns)
+            select = ("SELECT " + ", ".join(fix_columns) + ', rowid FROM "' + table.name + '" WHERE rowid > ? AND (' +
+                      where + ") ORDER BY rowid LIMIT " + str(batch_size))
+            update = ('UPDATE "' + table.name + '" SET ' + ", ".join(column + " = ?" for column in fix_columns) +
+                      " WHERE rowid = ?")
+            last_rowid = -2**63
+            with conn:  # One transaction, rows fixed in batches (sqlite replace() stops at null bytes)
+                while rows := conn.execute(select, (last_rowid, )).fetchall():
+                    conn.executemany(update, ([x.replace("\0", "") if isinstance(x, str) else x for x in row]
+                                              for row in rows))
+                    last_rowid = rows[-1][-1]
+    finally:
+        conn.close()
 
 
 def archive_dir(source, cfg):
@@ -342,36 +560,54 @@ def archive_dir(source, cfg):
 
 
 def archive_tar(source, cfg):
+    """
+    Check and extract tar-file or volume set (source is set path <name>.tar for volumes <name>.001.tar etc.)
+    """
     gui.print_msg("Checking '" + source.name + "' for modified content...", style=gui.style.info)
 
     state = 0  # Untracked, modified unknown
-    config_db = configdb.create_db(Path(cfg.tmp_dir, "documents-config.db"))
+    project_dir = source.parents[2]  # <project>/content/documents/<name>.tar
+    config_db = configdb.create_db(Path(project_dir, "tmp", "documents-config.db"))
+    volumes = []
+    source_path = str(source)
     for row in config_db["files"].rows:
-        tar_disk_path = Path(cfg.source, row["tar_path"])
-        if tar_disk_path == source:  # tar-file in configdb
-            new_tar_mtime = str(tar_disk_path.stat().st_mtime)
-            if new_tar_mtime == row["tar_mtime"]:  # Not moved since last check->state 1
+        if _tar.get_volume_set_path(Path(project_dir, row["tar_path"])) == source:  # tar-file in configdb
+            source_path = row["source_path"]
+            volumes = configdb.get_tar_volumes(config_db, project_dir, row)
+            new_tar_mtime = str(volumes[0][0].stat().st_mtime)
+            if any(configdb.get_checksum(config_db, tar_disk_path) != checksum  # Modified -> state 3
+                   for tar_disk_path, checksum in volumes):
+                state = 3
+            elif new_tar_mtime == row["tar_mtime"]:  # Not moved since last check->state 1
                 state = 1
-            elif _file.get_checksum(tar_disk_path) == row["tar_checksum"]:  # Moved but content unchanged->state 2
-                config_db["files"].update(row["source_path"], {"tar_mtime": new_tar_mtime})  # Avoid checksum next run
+            else:  # Moved but content unchanged->state 2
+                config_db["files"].update(row["source_path"], {"tar_mtime": new_tar_mtime})
                 state = 2
-            else:  # Modified -> state 3
-                state = 3
 
             break
 
     if state == 0:
         gui.print_msg("Untracked file! Generating checksum for future reference...", style=gui.style.warning)
-        cfg.config_db["files"].insert(
-            {
-                "source_path": source,
-                "tar_path": str(source.relative_to(cfg.source)),
-                "tar_checksum": _file.get_checksum(source),
-                "tar_mtime": str(source.stat().st_mtime),
-                "tar_status": "created",
-            },
-            pk="source_path",
-        )
+        volumes = [(tar_disk_path, configdb.get_checksum(config_db, tar_disk_path))
+                   for tar_disk_path in _tar.get_volume_paths(source)]
+        with config_db.conn:
+            config_db["files"].insert(
+                {
+                    "source_path": str(source),
+                    "tar_path": str(source.relative_to(project_dir)),
+                    "tar_checksum": volumes[0][1],
+                    "tar_mtime": str(volumes[0][0].stat().st_mtime),
+                    "tar_status": "created",
+                },
+                pk="source_path",
+            )
+            if len(volumes) > 1:
+                config_db["tar_volumes"].insert_all(({
+                    "tar_path": str(tar_disk_path.relative_to(project_dir)),
+                    "source_path": str(source),
+                    "volume": volume,
+                    "checksum": checksum,
+                } for volume, (tar_disk_path, checksum) in enumerate(volumes, start=1)), pk="tar_path")
     elif state in [1, 2]:
         gui.print_msg("File verified!", style=gui.style.ok)
     elif state == 3:
@@ -379,14 +615,30 @@ def archive_tar(source, cfg):
         if not ok:
             gui.print_msg("Aborted.", exit=True)
 
-    if os.name == "posix" and shutil.which("tar") is not None:  # Extract with gnu tar
-        cmd = f"tar -xf {str(source)} -C {str(Path(source).parent)}"
-        exit_code, output = command_runner(cmd, encoding="utf-8")
-        if exit_code != 0:
-            gui.print_msg(output, exit=True)
-            # TODO: Slette feilaktig eksportert mappe her eller lenger nede så samme for pytar og gnutar!
-        # else:
-        # TODO: Slette tar-fil her eller først senere? -> Riktig ift sjekker tidligere om eksportert tar?
+    members = {
+        tar_disk_path: list(config_db["tar_members"].rows_where("tar_path = ?",
+                                                                [str(tar_disk_path.relative_to(project_dir))]))
+        for tar_disk_path, _ in volumes
+    }
+    if all(members.values()) and state in [1, 2]:  # Extract changed members only, by offset from member index
+        gui.print_msg("Extracting and verifying changed members...", style=gui.style.info)
+        failed = []
+        for tar_disk_path, volume_members in members.items():
+            failed.extend(_tar.extract_members(tar_disk_path, volume_members, source.parent))
+        if failed:
+            gui.print_msg("Checksum mismatch for members: " + ", ".join(failed[:10]), exit=True)
+    elif os.name == "posix" and shutil.which("tar") is not None:  # Extract with gnu tar
+        for tar_disk_path, _ in volumes:
+            cmd = f"tar -xf {str(tar_disk_path)} -C {str(Path(source).parent)}"
+            exit_code, output = command_runner(cmd, encoding="utf-8")
+            if exit_code != 0:
+                gui.print_msg(output, exit=True)
+                # TODO: Slette feilaktig eksportert mappe her eller lenger nede så samme for pytar og gnutar!
+    else:
+        return
+
+    # Tar-file is deleted by get_sources on next run only when completely extracted:
+    config_db["files"].update(source_path, {"tar_status": "extracted"})
 
     # args.target_tar_path = _file.get_unique_file(Path(args.content_dir, Path(args.source).name + ".tar"))
     # if os.name == "posix" and (lambda x: shutil.which("tar") is not None):
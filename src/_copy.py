@@ -14,22 +14,19 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from pathlib import Path
-import tarfile
-import shutil
-import os
 
 from pathvalidate import replace_symbol
-from command_runner import command_runner
 from rich.prompt import Confirm
 import configdb
 import gui
 import jdbc
 import config
 import project
+import profiler
 import dp
 import sqlwb
 import db
-from utils import _file
+from utils import _file, _tar
 import _sqlite
 
 
@@ -84,6 +81,7 @@ def get_include_tables(cfg):
     if tables and not set(tables).issubset(copied_tables):
         configdb.update_table_deps(tables, cfg)
         jdbc.fix_columns_rows(tables, first_run, cfg)
+        profiler.run(tables, cfg)
         changed = True
 
     return changed
@@ -171,22 +169,30 @@ def get_copy_cfg(main_cfg):
     return project.confirm(cfg)
 
 
-def capture_files(cfg):
-    copied = 0
-    for row in cfg.config_db["files"].rows:
-        tar_disk_path = Path(cfg.project_dir, row["tar_path"])
+def delete_tar_volumes(cfg, source_path):
+    with cfg.config_db.conn:
+        cfg.config_db.execute("DELETE FROM tar_members WHERE tar_path IN (SELECT tar_path FROM tar_volumes "
+                              "WHERE source_path = ?)", [source_path])
+        cfg.config_db.execute("DELETE FROM tar_volumes WHERE source_path = ?", [source_path])
+        cfg.config_db.execute("DELETE FROM files WHERE source_path = ?", [source_path])
 
-        if tar_disk_path.is_file() and tar_disk_path.stat().st_size == 0:
-            tar_disk_path.unlink()
 
-        if not tar_disk_path.is_file():
-            cfg.config_db["files"].delete(row["source_path"])
+def capture_files(cfg):
+    copied = 0
+    for row in list(cfg.config_db["files"].rows):
+        volumes = configdb.get_tar_volumes(cfg.config_db, cfg.project_dir, row)
+        for tar_disk_path, _ in volumes:
+            if tar_disk_path.is_file() and tar_disk_path.stat().st_size == 0:
+                tar_disk_path.unlink()
+
+        if not all(tar_disk_path.is_file() for tar_disk_path, _ in volumes):
+            delete_tar_volumes(cfg, row["source_path"])
             continue
 
         if row["source_path"] == cfg.source:
             copied = 2
-            if (str(tar_disk_path.stat().st_mtime) == row["tar_mtime"]  # unmodified file (unmoved file)
-                    or _file.get_checksum(tar_disk_path) == row["tar_checksum"]):  # Unmodified file (moved file)
+            if all(configdb.get_checksum(cfg.config_db, tar_disk_path) == checksum  # Unmodified (cached)
+                   for tar_disk_path, checksum in volumes):
                 copied = 1
 
     if copied == 1:
@@ -198,31 +204,40 @@ def capture_files(cfg):
         if not ok:
             gui.print_msg("Aborted.", exit=True)
 
-        tar_disk_path.unlink()
-        cfg.config_db["files"].delete(cfg.source)
+        for tar_disk_path, _ in volumes:
+            tar_disk_path.unlink()
+        delete_tar_volumes(cfg, cfg.source)
 
     gui.print_msg("Creating tar-file from source directory...", style=gui.style.info)
 
     cfg.target_tar_path = _file.get_unique_file(Path(cfg.content_dir, Path(cfg.source).name + ".tar"))
-    if os.name == "posix" and shutil.which("tar") is not None:
-        cmd = f"tar -cf {str(cfg.target_tar_path)} -C {str(Path(cfg.source).parent)} {Path(cfg.source).name}"
-        exit_code, output = command_runner(cmd, encoding="utf-8")
-        if exit_code != 0:
-            gui.print_msg(output, exit=True)
-    else:
-        with tarfile.open(cfg.target_tar_path, mode="w") as archive:
-            archive.add(cfg.source, arcname="")
-
-    cfg.config_db["files"].insert(
-        {
-            "source_path": cfg.source,
-            "tar_path": str(cfg.target_tar_path.relative_to(cfg.project_dir)),
-            "tar_checksum": _file.get_checksum(cfg.target_tar_path),
-            "tar_mtime": str(cfg.target_tar_path.stat().st_mtime),
-            "tar_status": "created",
-        },
-        pk="source_path",
-    )
+    volumes = _tar.create_volumes(cfg.source, cfg.target_tar_path, cfg.jobs, cfg.tar_volume_size * 1024 * 1024)
+
+    with cfg.config_db.conn:  # Volumes and member index in one transaction
+        for volume, (tar_path, checksum, members) in enumerate(volumes, start=1):
+            tar_path = str(tar_path.relative_to(cfg.project_dir))
+            cfg.config_db["tar_volumes"].insert({
+                "tar_path": tar_path,
+                "source_path": cfg.source,
+                "volume": volume,
+                "checksum": checksum,
+            })
+            cfg.config_db["tar_members"].insert_all(({"tar_path": tar_path} | member for member in members),
+                                                    batch_size=1000)
+
+        cfg.config_db["files"].insert(
+            {
+                "source_path": cfg.source,
+                "tar_path": str(Path(cfg.target_tar_path).relative_to(cfg.project_dir)),  # Volume set
+                "tar_checksum": volumes[0][1],
+                "tar_mtime": str(volumes[0][0].stat().st_mtime),
+                "tar_status": "created",
+            },
+            pk="source_path",
+        )
+
+    for tar_path, checksum, _ in volumes:  # Hashed while written
+        configdb.set_checksum(cfg.config_db, tar_path, checksum)
 
 
 def run(main_cfg):
@@ -13,90 +13,543 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import os
+import re
+import csv
+import json
+import codecs
+import importlib.util
 import sqlite3
-import warnings
-import shutil
+import datetime
+import itertools
+import zipfile
+import xml.etree.ElementTree as ET
+import multiprocessing
+from queue import Empty
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 import petl as etl
-import openpyxl as op
 import db
 import configdb
-from command_runner import command_runner
 import gui
 
-warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl")
+DATA_FILES_MANIFEST = "data-files.txt"  # Written to tmp dir when source directory is classified
+BATCH_SIZE = 10000  # Rows sent from parser to writer at a time
+QUEUE_SIZE = 16  # Batches waiting to be written
+COMMIT_ROWS = 500000
+CSV_SAMPLE_SIZE = 64 * 1024  # Bytes read to detect encoding and dialect
+CSV_BUFFER_SIZE = 1024 * 1024
+XLSX_NS = {
+    "main": "http://schemas.openxmlformats.org/spreadsheetml/2006/main",
+    "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+    "rel": "http://schemas.openxmlformats.org/package/2006/relationships",
+}
+XLSX_DATE_FORMATS = (14, 15, 16, 17, 18, 19, 20, 21, 22, 45, 46, 47)  # Built-in date and time number formats
+ODS_NS = {
+    "office": "urn:oasis:names:tc:opendocument:xmlns:office:1.0",
+    "table": "urn:oasis:names:tc:opendocument:xmlns:table:1.0",
+    "text": "urn:oasis:names:tc:opendocument:xmlns:text:1.0",
+}
+ODS_CELLS = ("{" + ODS_NS["table"] + "}table-cell", "{" + ODS_NS["table"] + "}covered-table-cell")
+ODS_TIME_RE = re.compile(r"-?PT(?:(\d+)H)?(?:(\d+)M)?(?:([\d.]+)S)?")
 
 
 def ext_cmds():
     """
-    Get supported tabular files extensions and function to use for each.
+    Get supported tabular files extensions and reader to use for each.
+    Readers yield (table name, header, rows) per table in file.
     """
     ext_funcs = {
-        "json": (lambda fil, index, conn, args: import_json(fil, index, conn, args)),
-        "xlsx": (lambda fil, index, conn, args: import_excel(fil, index, conn, args)),
+        "json": read_json,
+        "xlsx": read_excel,
+        "ods": read_ods,
+        "csv": read_csv,
+        "tsv": read_csv,
     }
 
-    if os.name == "posix" and (lambda x: shutil.which("soffice") is not None):
-        ext_funcs["ods"] = lambda fil, index, conn, args: import_ods(fil, index, conn, args)
+    if importlib.util.find_spec("pyarrow") is not None:  # Optional dependency, only needed for parquet
+        ext_funcs["parquet"] = read_parquet
 
     return ext_funcs
 
 
-def import_excel(fil, index, conn, args):
+def get_xlsx_sheets(zf):
     """
-    Import xlsx files in sqlite database
+    Get (name, path) of sheets in workbook, and if 1904 date system is used
     """
-    wb = op.load_workbook(fil, read_only=True, data_only=True)
-    for ws_name in wb.sheetnames:
-        for row in wb[ws_name].values:
-            if all(value is None for value in row):
+    workbook = ET.fromstring(zf.read("xl/workbook.xml"))
+    rels = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+    targets = {rel.get("Id"): rel.get("Target") for rel in rels.iter("{" + XLSX_NS["rel"] + "}Relationship")}
+    sheets = []
+    for sheet in workbook.iter("{" + XLSX_NS["main"] + "}sheet"):
+        target = targets[sheet.get("{" + XLSX_NS["r"] + "}id")]
+        sheets.append((sheet.get("name"), target[1:] if target.startswith("/") else "xl/" + target))
+
+    pr = workbook.find("main:workbookPr", XLSX_NS)
+    date1904 = pr is not None and pr.get("date1904") in ("1", "true")
+    return sheets, date1904
+
+
+def get_shared_strings(zf):
+    strings = []
+    if "xl/sharedStrings.xml" not in zf.namelist():
+        return strings
+
+    with zf.open("xl/sharedStrings.xml") as f:
+        for _, elem in ET.iterparse(f):
+            if elem.tag == "{" + XLSX_NS["main"] + "}si":  # Plain or rich text, without phonetic runs
+                strings.append("".join(t.text or "" for t in elem.iterfind("main:t", XLSX_NS)) +
+                               "".join(t.text or "" for t in elem.iterfind("main:r/main:t", XLSX_NS)))
+                elem.clear()
+
+    return strings
+
+
+def get_date_styles(zf):
+    """
+    Get indexes of cell styles with date or time number formats
+    """
+    if "xl/styles.xml" not in zf.namelist():
+        return set()
+
+    styles = ET.fromstring(zf.read("xl/styles.xml"))
+    date_formats = set(XLSX_DATE_FORMATS)
+    for fmt in styles.iterfind("main:numFmts/main:numFmt", XLSX_NS):
+        code = re.sub(r'"[^"]*"|\[[^]]*]|\\.', "", fmt.get("formatCode", "")).lower()
+        if any(x in code for x in "dmyhs"):
+            date_formats.add(int(fmt.get("numFmtId")))
+
+    return {idx for idx, xf in enumerate(styles.iterfind("main:cellXfs/main:xf", XLSX_NS))
+            if int(xf.get("numFmtId", 0)) in date_formats}
+
+
+def get_column_index(ref):
+    idx = 0
+    for char in ref:
+        if not char.isalpha():
+            break
+        idx = idx * 26 + ord(char.upper()) - 64
+
+    return idx - 1
+
+
+def get_cell_value(cell, shared_strings, date_styles, date1904):
+    cell_type = cell.get("t", "n")
+    if cell_type == "inlineStr":
+        return "".join(t.text or "" for t in cell.iter("{" + XLSX_NS["main"] + "}t"))
+
+    value = cell.findtext("main:v", None, XLSX_NS)
+    if value is None:
+        return None
+
+    if cell_type == "s":
+        return shared_strings[int(value)]
+    if cell_type == "b":
+        return value == "1"
+    if cell_type != "n":  # Formula strings and errors
+        return value
+
+    number = float(value)
+    if int(cell.get("s", 0)) in date_styles:
+        if number < 1 and not date1904:
+            return (datetime.datetime.min + datetime.timedelta(days=number)).time()
+        if number < 60 and not date1904:  # Excel treats 1900 as leap year
+            number += 1
+        epoch = datetime.datetime(1904, 1, 1) if date1904 else datetime.datetime(1899, 12, 30)
+        return epoch + datetime.timedelta(days=number)
+
+    return int(number) if number.is_integer() and "." not in value and "E" not in value.upper() else number
+
+
+def read_sheet(zf, path, shared_strings, date_styles, date1904):
+    """
+    Stream rows of sheet, keeping only the current row in memory
+    """
+    with zf.open(path) as f:
+        sheet_data = None
+        for event, elem in ET.iterparse(f, events=("start", "end")):
+            if event == "start":
+                if elem.tag == "{" + XLSX_NS["main"] + "}sheetData":
+                    sheet_data = elem
+                continue
+
+            if elem.tag != "{" + XLSX_NS["main"] + "}row":
+                continue
+
+            row = []
+            for cell in elem.iterfind("main:c", XLSX_NS):
+                idx = get_column_index(cell.get("r")) if cell.get("r") else len(row)
+                row.extend([None] * (idx - len(row)))
+                row.append(get_cell_value(cell, shared_strings, date_styles, date1904))
+
+            sheet_data.clear()  # Drop parsed rows
+            yield row
+
+
+def read_excel(fil, index, tmp_dir):
+    """
+    Read sheets in xlsx file by streaming the sheet xml. The first non-empty row is used as header.
+    """
+    with zipfile.ZipFile(fil) as zf:
+        sheets, date1904 = get_xlsx_sheets(zf)
+        shared_strings = get_shared_strings(zf)
+        date_styles = get_date_styles(zf)
+        for ws_name, path in sheets:
+            rows = read_sheet(zf, path, shared_strings, date_styles, date1904)
+            header = next((row for row in rows if any(value is not None for value in row)), None)
+            if header is None:
                 continue  # Ignore empty sheets
 
-        table_name = db.normalize_name(ws_name, index, length=True)
-        gui.print_msg("Creating and populating table '" + table_name + "'", style=gui.style.info, highlight=True)
-        table = etl.io.xlsx.fromxlsx(fil, sheet=ws_name, read_only=True)
-        etl.todb(table, conn, table_name, create=True, constraints=False)
+            yield db.normalize_name(ws_name, index, length=True), header, rows
+
+
+def read_json(fil, index, tmp_dir):
+    """
+    Read json lines file. Each line is treated as a row of data.
+    """
+    with open(fil, encoding="utf-8") as f:
+        lines = (json.loads(line) for line in f if line.strip())
+        sample = list(itertools.islice(lines, BATCH_SIZE))
+        header = list(dict.fromkeys(key for row in sample for key in row))
+        rows = ([row.get(key) for key in header] for row in itertools.chain(sample, lines))
+        yield db.normalize_name(fil.with_suffix("").name, index, length=True), header, rows
+
+
+def get_ods_text(elem):
+    text = elem.text or ""
+    for child in elem:
+        if child.tag == "{" + ODS_NS["text"] + "}s":
+            text += " " * int(child.get("{" + ODS_NS["text"] + "}c", 1))
+        elif child.tag == "{" + ODS_NS["text"] + "}tab":
+            text += "\t"
+        elif child.tag == "{" + ODS_NS["text"] + "}line-break":
+            text += "\n"
+        else:
+            text += get_ods_text(child)
+        text += child.tail or ""
+
+    return text
+
 
+def get_ods_value(cell):
+    value_type = cell.get("{" + ODS_NS["office"] + "}value-type")
+    if value_type in ("float", "percentage", "currency"):
+        value = cell.get("{" + ODS_NS["office"] + "}value")
+        number = float(value)
+        return int(number) if number.is_integer() and "." not in value and "E" not in value.upper() else number
+    if value_type == "date":
+        value = cell.get("{" + ODS_NS["office"] + "}date-value")
+        return datetime.datetime.fromisoformat(value) if "T" in value else datetime.date.fromisoformat(value)
+    if value_type == "time":
+        hours, minutes, seconds = ODS_TIME_RE.fullmatch(cell.get("{" + ODS_NS["office"] + "}time-value")).groups()
+        return (datetime.datetime.min + datetime.timedelta(
+            hours=int(hours or 0), minutes=int(minutes or 0), seconds=float(seconds or 0))).time()
+    if value_type == "boolean":
+        return cell.get("{" + ODS_NS["office"] + "}boolean-value") == "true"
 
-def import_json(fil, index, conn, args):
+    paragraphs = cell.findall("text:p", ODS_NS)
+    return "\n".join(get_ods_text(p) for p in paragraphs) if paragraphs else None
+
+
+def get_ods_rows(f):
     """
-    Import json file data in sqlite database.
-    The file must contain a JSON array as the top level object.
-    Each member of the array will be treated as a row of data.
+    Stream (table name, row) from ods content xml, keeping only the current row in memory.
+    Repeated empty rows and cells are only expanded when followed by data.
     """
-    table = etl.fromjson(fil, lines=True)
-    table_name = db.normalize_name(fil.with_suffix("").name, index)
-    etl.todb(table, conn, table_name, create=True, constraints=False)
+    table_name = None
+    empty_rows = 0
+    stack = []
+    for event, elem in ET.iterparse(f, events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            if elem.tag == "{" + ODS_NS["table"] + "}table":
+                table_name = elem.get("{" + ODS_NS["table"] + "}name")
+                empty_rows = 0
+            continue
+
+        stack.pop()
+        if elem.tag != "{" + ODS_NS["table"] + "}table-row":
+            continue
+
+        row = []
+        empty_cells = 0
+        for cell in elem:
+            if cell.tag not in ODS_CELLS:
+                continue
+
+            repeat = int(cell.get("{" + ODS_NS["table"] + "}number-columns-repeated", 1))
+            value = get_ods_value(cell)
+            if value is None:
+                empty_cells += repeat
+                continue
+
+            row.extend([None] * empty_cells + [value] * repeat)
+            empty_cells = 0
+
+        repeat = int(elem.get("{" + ODS_NS["table"] + "}number-rows-repeated", 1))
+        stack[-1].remove(elem)  # Drop parsed row
+        if not row:
+            empty_rows += repeat
+            continue
+
+        for _ in range(empty_rows):
+            yield table_name, []
+        for _ in range(repeat):
+            yield table_name, list(row)
+        empty_rows = 0
+
+
+def read_ods(fil, index, tmp_dir):
+    """
+    Read sheets in ods file by streaming content xml. The first non-empty row is used as header.
+    """
+    with zipfile.ZipFile(fil) as zf, zf.open("content.xml") as f:
+        for ws_name, items in itertools.groupby(get_ods_rows(f), key=lambda x: x[0]):
+            rows = (row for _, row in items)
+            header = next((row for row in rows if row), None)
+            if header is None:
+                continue
+
+            yield db.normalize_name(ws_name, index, length=True), header, rows
 
 
-def import_ods(fil, index, conn, args):
+def get_csv_format(fil):
     """
-    Convert ods files to xlsx before importing because existing python ods readers are much too slow.
+    Detect encoding and dialect of csv or tsv file from sample of its start
     """
-    cmd = f"soffice --headless --convert-to xlsx {str(fil)} --outdir {str(args.tmp_dir)}"
-    gui.print_msg("Converting '" + fil.name + "' to Excel format.", style=gui.style.info, highlight=True)
-    exit_code, output = command_runner(cmd, timeout=180, encoding="utf-8")
-    if exit_code == 0:
-        import_excel(Path(args.tmp_dir, fil.with_suffix(".xlsx").name), index, conn, args)
-    else:
-        gui.print_msg(output, exit=True)
+    with open(fil, "rb") as f:
+        sample = f.read(CSV_SAMPLE_SIZE)
+
+    encoding = "utf-8-sig"
+    try:
+        text = codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+    except UnicodeDecodeError:
+        encoding = "cp1252"
+        text = sample.decode(encoding, "replace")
+
+    lines = text.splitlines()
+    if len(sample) == CSV_SAMPLE_SIZE and len(lines) > 1:
+        text = "\n".join(lines[:-1])  # Skip last line which may be cut
+
+    try:
+        dialect = csv.Sniffer().sniff(text, delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel_tab if fil.suffix.lower() == ".tsv" else csv.excel
+
+    return encoding, dialect
+
+
+def read_csv(fil, index, tmp_dir):
+    """
+    Read csv or tsv file. The first row is used as header and empty values are read as null.
+    """
+    encoding, dialect = get_csv_format(fil)
+    csv.field_size_limit(2**31 - 1)
+    with open(fil, encoding=encoding, errors="replace", newline="", buffering=CSV_BUFFER_SIZE) as f:
+        reader = csv.reader(f, dialect)
+        header = next(reader, None)
+        if header is None:
+            return
+
+        rows = ([value if value != "" else None for value in row] for row in reader)
+        yield db.normalize_name(fil.with_suffix("").name, index, length=True), header, rows
+
+
+def read_parquet(fil, index, tmp_dir):
+    """
+    Read parquet file in batches of rows, reading one row group at a time
+    """
+    import pyarrow.parquet as pq
+
+    pf = pq.ParquetFile(fil)
+    rows = (row for batch in pf.iter_batches(batch_size=BATCH_SIZE)
+            for row in zip(*(column.to_pylist() for column in batch.columns)))
+    yield db.normalize_name(fil.with_suffix("").name, index, length=True), pf.schema_arrow.names, rows
+
+
+def get_column_names(header):
+    """
+    Unique, non-empty column names from header row
+    """
+    names = []
+    for idx, name in enumerate(header):
+        name = str(name).strip() if name is not None else ""
+        name = name or "column_" + str(idx + 1)
+        unique_name = name
+        count = 1
+        while unique_name.lower() in (x.lower() for x in names):
+            count += 1
+            unique_name = name + "_" + str(count)
+        names.append(unique_name)
+
+    return names
+
+
+def to_sqlite(value):
+    if value is None or isinstance(value, (int, float, str, bytes)):
+        return value
+
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+
+    return str(value)
+
+
+def get_column_types(rows, width):
+    """
+    Infer sqlite column types from sample of rows
+    """
+    types = []
+    for idx in range(width):
+        values = [row[idx] for row in rows if row[idx] is not None]
+        if values and all(isinstance(x, int) for x in values):
+            types.append("INTEGER")
+        elif values and all(isinstance(x, (int, float)) for x in values):
+            types.append("REAL")
+        elif values and all(isinstance(x, bytes) for x in values):
+            types.append("BLOB")
+        else:
+            types.append("TEXT")
+
+    return types
+
+
+def read_file(fil, index, tmp_dir, queue):
+    """
+    Parse one file and send its tables in batches of rows to the writer (runs in a worker process)
+    """
+    error = None
+    try:
+        reader = ext_cmds()[fil.suffix[1:].lower()]
+        for table_no, (table_name, header, rows) in enumerate(reader(fil, index, tmp_dir)):
+            key = (index, table_no)  # Table names are made unique by the writer
+            columns = get_column_names(header)
+            width = len(columns)
+            batch = []
+            sent = False
+            for row in rows:
+                row = tuple(to_sqlite(value) for value in row[:width])
+                batch.append(row + (None, ) * (width - len(row)))
+                if len(batch) == BATCH_SIZE:
+                    if not sent:
+                        queue.put(("table", key, table_name, columns, get_column_types(batch, width)))
+                        sent = True
+                    queue.put(("rows", key, batch))
+                    batch = []
+
+            if not sent:
+                queue.put(("table", key, table_name, columns, get_column_types(batch, width)))
+            if batch:
+                queue.put(("rows", key, batch))
+    except Exception as e:
+        error = str(fil) + ": " + repr(e)
+
+    queue.put(("done", index, error))
+
+
+def get_data_files(args, ext_funcs):
+    manifest = Path(Path(args.source_db_path).parent, DATA_FILES_MANIFEST)
+    if manifest.is_file():
+        return [Path(fil) for fil in manifest.read_text(encoding="utf-8").splitlines()]
+
+    return sorted(fil for fil in args.data_files_dir.rglob("*") if fil.suffix[1:].lower() in ext_funcs.keys())
+
+
+def get_unique_table_name(table_name, created):
+    """
+    Add number to table name already created in this import (lower case as sqlite names are case insensitive)
+    """
+    unique_name = table_name
+    count = 1
+    while unique_name.lower() in created:
+        count += 1
+        unique_name = table_name + "_" + str(count)
+
+    created.add(unique_name.lower())
+    return unique_name
+
+
+def write_table(conn, table_name, columns, types):
+    conn.execute('DROP TABLE IF EXISTS "' + table_name + '"')  # Left by earlier import
+    conn.execute('CREATE TABLE "' + table_name + '" (' + ", ".join(
+        '"' + column.replace('"', '""') + '" ' + type for column, type in zip(columns, types)) + ")")
+
+    return 'INSERT INTO "' + table_name + '" VALUES (' + ", ".join("?" for _ in columns) + ")"
 
 
 def import_files(args):
     """
     Import supported tabular files in source directory in sqlite database.
+    Files are parsed in parallel worker processes and written by one connection in large transactions.
     """
-    conn = sqlite3.connect(args.source_db_path)
     gui.print_msg("Creating sqlite database from files in directory...", style=gui.style.info)
-    ext_funcs = ext_cmds()
+    files = get_data_files(args, ext_cmds())
+    conn = sqlite3.connect(args.source_db_path)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
 
-    for index, fil in enumerate(args.data_files_dir.rglob("*")):
-        if fil.suffix[1:].lower() not in ext_funcs.keys():
-            continue
+    errors = []
+    inserts = {}
+    created = set()
+    row_count = 0
+    with multiprocessing.Manager() as manager:
+        queue = manager.Queue(maxsize=QUEUE_SIZE)  # Bounded so parsing can not run far ahead of writing
+        with ProcessPoolExecutor(max_workers=args.jobs, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = {
+                index + 1: executor.submit(read_file, fil, index + 1, args.tmp_dir, queue)
+                for index, fil in enumerate(files)
+            }
+
+            pending = set(futures)
+            while pending:
+                try:
+                    msg = queue.get(timeout=1)
+                except Empty:  # Workers that died or failed outside read_file never report back
+                    for index in list(pending):
+                        future = futures[index]
+                        if future.cancelled() or (future.done() and future.exception()):
+                            if not future.cancelled():
+                                errors.append(str(files[index - 1]) + ": " + repr(future.exception()))
+                            pending.discard(index)
+                    continue
+
+                if msg[0] == "done":
+                    pending.discard(msg[1])
+                    if msg[2]:
+                        errors.append(msg[2])
+                    continue
+
+                if errors:  # Drain queue so running workers are not blocked on a full queue
+                    continue
+
+                try:
+                    if msg[0] == "table":
+                        key, table_name, columns, types = msg[1:]
+                        table_name = get_unique_table_name(table_name, created)
+                        gui.print_msg("Creating and populating table '" + table_name + "'", style=gui.style.info,
+                                      highlight=True)
+                        inserts[key] = write_table(conn, table_name, columns, types)
+                    else:
+                        conn.executemany(inserts[msg[1]], msg[2])
+                        row_count += len(msg[2])
+                        if row_count >= COMMIT_ROWS:
+                            conn.commit()
+                            row_count = 0
+                except Exception as e:
+                    errors.append("Writing to '" + str(args.source_db_path) + "': " + repr(e))
+
+                if errors:  # Stop files not yet started
+                    for index, future in futures.items():
+                        if future.cancel():
+                            pending.discard(index)
 
-        ext_funcs[fil.suffix[1:].lower()](fil, index + 1, conn, args)
+    conn.commit()
+    conn.close()
+    if errors:
+        gui.print_msg("Import of tabular files failed:\n" + "\n".join(errors), exit=True)
 
 
 def export_xlsx(file_path, query, args):
@@ -42,6 +42,8 @@ class Main:  # TODO: Get some values from config file!
     stop: bool
     no_blobs: bool
     schema: str
+    sample: int
+    ddl_dialects: list
     test: bool
     source: str
     target: str
@@ -49,6 +51,10 @@ class Main:  # TODO: Get some values from config file!
     jdbc_drivers: dict
     jar_files: list
     config_db: sqlite_utils.db.Database = None
+    jobs: int = min(8, os.cpu_count() or 1)  # Max number of parallel workers
+    compression: str = None  # Compression of exported tsv-files (gzip or zstd)
+    compression_level: int = None
+    tar_volume_size: int = 0  # Max size of tar volumes in MB (0 for one tar-file per directory)
     pwcode_dir: Path = Path(os.getenv("pwcode_dir"))
     tmp_dir: Path = Path(pwcode_dir, "projects", "tmp")
     projects_dir: Path = Path(pwcode_dir, "projects")
@@ -146,5 +152,6 @@ def load(cfg_file):
             jar_files.append(cfg["jar"])
 
     login_alias = configuration.get("aliases", {})
+    type_rules = configuration.get("types") or {}
 
-    return login_alias, jdbc_drivers, jar_files
+    return login_alias, jdbc_drivers, jar_files, type_rules
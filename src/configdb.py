@@ -22,6 +22,8 @@ from sqlite_utils.db import NotFoundError
 from toposort import toposort_flatten
 from pathlib import Path
 import json
+import os
+from utils import _file
 
 
 @dataclass
@@ -141,6 +143,77 @@ def create_db(path):
         if_not_exists=True,
     )
 
+    configdb["column_stats"].create(
+        {
+            "tbl_col_pos": str,
+            "source_table": str,
+            "source_column": str,
+            "row_count": int,  # Rows profiled (less than table row count if sampled)
+            "null_count": int,  # Nulls and empty strings
+            "distinct_count": int,  # HyperLogLog estimate
+            "max_length": int,
+            "min_value": str,
+            "max_value": str,
+            "precision": int,  # Max number of digits (numeric columns only)
+            "scale": int,  # Max number of decimals (numeric columns only)
+            "complete": int,  # All rows profiled if == 1
+        },
+        pk="tbl_col_pos",
+        foreign_keys=[("tbl_col_pos", "columns", "tbl_col_pos")],  # tbl_col_pos references columns.tbl_col_pos
+        if_not_exists=True,
+    )
+
+    configdb["lob_files"].create(
+        {
+            "file_name": str,  # Exported file under documents (<table>_<column><rowid>.data)
+            "source_table": str,
+            "source_column": str,
+            "source_rowid": int,
+            "size": int,  # Bytes
+            "checksum": str,  # blake3
+        },
+        pk="file_name",
+        if_not_exists=True,
+    )
+
+    configdb["checksums"].create(
+        {
+            "dev": int,
+            "inode": int,
+            "size": int,
+            "mtime_ns": int,
+            "path": str,  # Last known path (file may have been moved since)
+            "checksum": str,  # blake3
+        },
+        pk=("dev", "inode", "size", "mtime_ns"),
+        if_not_exists=True,
+    )
+
+    configdb["tar_volumes"].create(
+        {
+            "tar_path": str,  # Relative to project directory
+            "source_path": str,  # Directory packed (files.source_path)
+            "volume": int,
+            "checksum": str,  # blake3 of tar-file
+        },
+        pk="tar_path",
+        if_not_exists=True,
+    )
+
+    configdb["tar_members"].create(
+        {
+            "tar_path": str,
+            "member": str,  # Path in tar-file
+            "header_offset": int,
+            "offset": int,  # Start of member data in tar-file
+            "size": int,
+            "mtime": int,
+            "checksum": str,  # blake3 of member data (regular files only)
+        },
+        pk=("tar_path", "member"),
+        if_not_exists=True,
+    )
+
     configdb["files"].create(
         {
             "source_path": str,
@@ -301,6 +374,62 @@ def connect_column_fk(cfg):
         })
 
 
+def get_checksum(config_db, path):
+    """
+    Get checksum of file from cache keyed by device, inode, size and mtime (hashed only if not cached)
+    """
+    st = os.stat(path)
+    key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)  # Unchanged by moving file within filesystem
+    sql = "SELECT checksum, path FROM checksums WHERE dev = ? AND inode = ? AND size = ? AND mtime_ns = ?"
+    row = config_db.execute(sql, key).fetchone()
+    if row:
+        if row[1] != str(path):  # Moved
+            with config_db.conn:
+                config_db.execute("UPDATE checksums SET path = ? WHERE dev = ? AND inode = ?", (str(path), ) + key[:2])
+        return row[0]
+
+    return set_checksum(config_db, path, _file.get_checksum(path))
+
+
+def get_tar_volumes(config_db, project_dir, row):
+    """
+    Get (tar path, checksum) of all volumes of a copied directory, from its row in files table
+    """
+    volumes = [(Path(project_dir, x["tar_path"]), x["checksum"])
+               for x in config_db["tar_volumes"].rows_where("source_path = ?", [row["source_path"]], order_by="volume")]
+
+    return volumes or [(Path(project_dir, row["tar_path"]), row["tar_checksum"])]
+
+
+def get_tar_status(project_dir, tar_path):
+    """
+    Get status of tar-file or volume set from documents config database (None if untracked)
+    """
+    db_path = Path(project_dir, "tmp", "documents-config.db")
+    if not db_path.is_file():
+        return None
+
+    config_db = create_db(db_path)
+    row = next(config_db["files"].rows_where("tar_path = ?", [str(Path(tar_path).relative_to(project_dir))]), None)
+    return row["tar_status"] if row else None
+
+
+def set_checksum(config_db, path, checksum):
+    """
+    Save checksum of file to cache (for checksums computed while writing the file)
+    """
+    st = os.stat(path)
+    key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+    with config_db.conn:
+        config_db.execute("DELETE FROM checksums WHERE dev = ? AND inode = ?", key[:2])  # Outdated entry for file
+        config_db["checksums"].insert(dict(zip(("dev", "inode", "size", "mtime_ns"), key)) | {
+            "path": str(path),
+            "checksum": checksum
+        })
+
+    return checksum
+
+
 def get_norm_tables(config_db):
     """
     Retrieve table names to normalized table names mapping
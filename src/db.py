@@ -21,7 +21,6 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-import petl as etl
 import gui
 import configdb
 from sqlite_utils import Database
@@ -74,41 +73,112 @@ def fix_fk(cfg):
         db.index_foreign_keys()  # Add indexes to any foreign keys without
 
 
-def get_type(key_column, value_column, Key_value):
+def get_type(key_column, value_column, key_value):
     """ Only jdbc to/from datapackage used for now. The rest is decided by sqlalchemy """
-    db_types = [
-        ["jdbc_no", "jdbc_name", "iso", "sqlite", "postgresql", "oracle", "datapackage"],
-        [-16, "longnvarchar", "clob", "clob", "text", "clob", "string"],
-        [-15, "nchar", "varchar()", "varchar()", "varchar()", "varchar()", "string"],
-        [-9, "nvarchar", "varchar()", "varchar()", "varchar()", "varchar()", "string"],
-        [-8, "rowid", "varchar()", "varchar()", "varchar()", "varchar()", "string"],
-        [-7, "bit", "boolean", "boolean", "boolean", "integer", "integer"],
-        [-6, "tinyint", "integer", "integer", "integer", "integer", "integer"],
-        [-5, "bigint", "bigint", "bigint", "bigint", "number", "integer"],
-        [-4, "longvarbinary", "blob", "blob", "bytea", "blob", "string"],
-        [-3, "varbinary", "blob", "blob", "bytea", "blob", "string"],
-        [-2, "binary", "blob", "blob", "bytea", "blob", "string"],
-        [-1, "longvarchar", "clob", "clob", "text", "clob", "string"],
-        [1, "char", "varchar()", "varchar()", "varchar()", "varchar()", "string"],
-        [2, "numeric", "numeric", "numeric", "numeric", "numeric", "number"],
-        [3, "decimal", "decimal", "decimal", "decimal", "decimal", "number"],
-        [4, "integer", "integer", "integer", "integer", "integer", "integer"],
-        [5, "smallint", "integer", "integer", "integer", "integer", "integer"],
-        [6, "float", "float", "float", "number", "number", "number"],
-        [7, "real", "real", "real", "real", "real", "number"],
-        [8, "double", "double precision", "double precision", "double precision", "double precision", "number"],
-        [12, "varchar", "varchar()", "varchar()", "varchar()", "varchar()", "string"],
-        [16, "boolean", "boolean", "boolean", "boolean", "integer", "boolean"],
-        [91, "date", "date", "date", "date", "date", "date"],
-        [92, "time", "time", "time", "time", "date", "time"],
-        [93, "timestamp", "timestamp", "timestamp", "timestamp", "timestamp", "datetime"],
-        [2004, "blob", "blob", "blob", "bytea", "blob", "string"],
-        [2005, "clob", "clob", "clob", "text", "clob", "string"],
-        [2009, "SQLXML", "clob", "clob", "text", "clob", "string"],
-        [2011, "nclob", "clob", "clob", "text", "clob", "string"],
-    ]
-
-    return etl.lookup(db_types, key_column, value_column)[Key_value][0]
+    return TYPE_LOOKUPS[(key_column, value_column)][key_value]
+
+
+def get_cast(source_type, target_type, jdbc_data_type):
+    """
+    Get select expression template ('{column}' is replaced by quoted column name) for copying column, or None
+    """
+    return COPY_CASTS.get((source_type, target_type, jdbc_data_type))
+
+
+def update_types(type_rules):
+    """
+    Add or override type mappings and copy casts from 'types' section in config.yml
+    """
+    for jdbc_no, dp_type in (type_rules.get("datapackage") or {}).items():
+        TYPE_LOOKUPS[("jdbc_no", "datapackage")][int(jdbc_no)] = dp_type
+
+    for source_target, casts in (type_rules.get("casts") or {}).items():
+        source_type, _, target_type = source_target.partition("->")
+        for jdbc_no, cast in casts.items():
+            COPY_CASTS[(source_type.strip(), target_type.strip(), int(jdbc_no))] = cast
+
+
+def compile_types(db_types):
+    """
+    Compile type matrix to one dict per (key column, value column) pair
+    """
+    header = db_types[0]
+    lookups = {}
+    for key_idx, key_column in enumerate(header):
+        for value_idx, value_column in enumerate(header):
+            lookup = {}
+            for row in db_types[1:]:
+                lookup.setdefault(row[key_idx], row[value_idx])  # First match wins
+
+            lookups[(key_column, value_column)] = lookup
+
+    return lookups
+
+
+def compile_casts(cast_rules):
+    """
+    Expand cast rules per list of jdbc types to one entry per (source type, target type, jdbc type)
+    """
+    casts = {}
+    for (source_type, target_type, jdbc_data_types), cast in cast_rules.items():
+        for jdbc_data_type in jdbc_data_types:
+            casts[(source_type, target_type, jdbc_data_type)] = cast
+
+    return casts
+
+
+DB_TYPES = (
+    ("jdbc_no", "jdbc_name", "iso", "sqlite", "postgresql", "oracle", "datapackage"),
+    (-16, "longnvarchar", "clob", "clob", "text", "clob", "string"),
+    (-15, "nchar", "varchar()", "varchar()", "varchar()", "varchar()", "string"),
+    (-9, "nvarchar", "varchar()", "varchar()", "varchar()", "varchar()", "string"),
+    (-8, "rowid", "varchar()", "varchar()", "varchar()", "varchar()", "string"),
+    (-7, "bit", "boolean", "boolean", "boolean", "integer", "integer"),
+    (-6, "tinyint", "integer", "integer", "integer", "integer", "integer"),
+    (-5, "bigint", "bigint", "bigint", "bigint", "number", "integer"),
+    (-4, "longvarbinary", "blob", "blob", "bytea", "blob", "string"),
+    (-3, "varbinary", "blob", "blob", "bytea", "blob", "string"),
+    (-2, "binary", "blob", "blob", "bytea", "blob", "string"),
+    (-1, "longvarchar", "clob", "clob", "text", "clob", "string"),
+    (1, "char", "varchar()", "varchar()", "varchar()", "varchar()", "string"),
+    (2, "numeric", "numeric", "numeric", "numeric", "numeric", "number"),
+    (3, "decimal", "decimal", "decimal", "decimal", "decimal", "number"),
+    (4, "integer", "integer", "integer", "integer", "integer", "integer"),
+    (5, "smallint", "integer", "integer", "integer", "integer", "integer"),
+    (6, "float", "float", "float", "number", "number", "number"),
+    (7, "real", "real", "real", "real", "real", "number"),
+    (8, "double", "double precision", "double precision", "double precision", "double precision", "number"),
+    (12, "varchar", "varchar()", "varchar()", "varchar()", "varchar()", "string"),
+    (16, "boolean", "boolean", "boolean", "boolean", "integer", "boolean"),
+    (91, "date", "date", "date", "date", "date", "date"),
+    (92, "time", "time", "time", "time", "date", "time"),
+    (93, "timestamp", "timestamp", "timestamp", "timestamp", "timestamp", "datetime"),
+    (2004, "blob", "blob", "blob", "bytea", "blob", "string"),
+    (2005, "clob", "clob", "clob", "text", "clob", "string"),
+    (2009, "SQLXML", "clob", "clob", "text", "clob", "string"),
+    (2011, "nclob", "clob", "clob", "text", "clob", "string"),
+)
+
+# Select expressions per (source type, target type, jdbc types) used in copy statements:
+CAST_RULES = {
+    # Datetime to formatted string in sqlite:
+    ("h2", "sqlite", (91, 93)): "FORMATDATETIME({column},'YYYY-MM-DD HH:mm:ss')",
+    ("sqlite", "sqlite", (91, 93)): "DATETIME(SUBSTR({column},1,10), 'unixepoch')",
+    ("oracle", "sqlite", (91, 93)): "TO_CHAR({column},'YYYY-MM-DD HH24:MI:SS')",
+    ("access", "sqlite", (91, 93)): "FORMAT({column}, 'yyyy-MM-dd HH:nn:ss')",
+    ("sqlserver", "sqlite", (91, 93)): "FORMAT({column}, 'yyyy-MM-dd HH:mm:ss')",
+    # Time to formatted string in sqlite:
+    ("h2", "sqlite", (92, )): "FORMATDATETIME({column},'HH:mm:ss')",
+    ("sqlite", "sqlite", (92, )): "TIME({column})",
+    ("oracle", "sqlite", (92, )): "TO_CHAR({column},'HH24:MI:SS')",
+    ("access", "sqlite", (92, )): "FORMAT({column}, 'HH:nn:ss')",
+    ("sqlserver", "sqlite", (92, )): "FORMAT({column}, 'hh:mm:ss')",
+    # Un-mangle GUIDs stored in RAW columns in oracle:
+    ("oracle", "sqlite", (-3, )): "UTL_RAW.CAST_TO_VARCHAR2(UTL_RAW.CAST_TO_RAW({column}))",
+}
+
+TYPE_LOOKUPS = compile_types(DB_TYPES)
+COPY_CASTS = compile_casts(CAST_RULES)
 
 
 def normalize_name(name, index, length=False):
@@ -21,20 +21,149 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import os
 import json
 from pathlib import Path
+from dataclasses import dataclass, field as dc_field
 
 import gui
-from frictionless import Package, Resource, platform
-from typing import Type, Dict
+from typing import Dict
 import db
 import sqlalchemy as sa
-from sqlalchemy.schema import CreateTable
+from sqlalchemy.schema import CreateTable, AddConstraint
 from sqlalchemy.types import TypeEngine
+from sqlalchemy.engine.default import DefaultDialect
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ColumnElement
 from sqlalchemy.dialects.oracle import VARCHAR2
+from sqlalchemy.dialects import postgresql as sapg
 import configdb
 
 
+PACKAGES = {}  # Parsed datapackage.json files by path
+
+# Datapackage field type to sqlalchemy type (with dialect variants):
+SA_TYPES: Dict[str, TypeEngine] = {
+    "any": sa.Text,
+    "array": sa.Text().with_variant(sapg.JSONB(), "postgresql"),
+    "boolean": sa.Boolean,
+    "date": sa.Date,
+    "datetime": sa.DateTime,
+    "geojson": sa.Text().with_variant(sapg.JSONB(), "postgresql"),
+    "integer": sa.Integer,
+    #"number": sa.Float,
+    "number": sa.Numeric,
+    "object": sa.Text().with_variant(sapg.JSONB(), "postgresql"),
+    "string": sa.Text,
+    "time": sa.Time,
+    "year": sa.Integer,
+}
+
+# Sqlalchemy dialect used to generate ddl per database type:
+DDL_DIALECTS = {
+    "h2": "postgresql",
+    "sqlserver": "mssql",
+    "iso": None,  # Generic sql
+}
+
+
+@dataclass
+class FieldInfo:
+    name: str
+    type: str
+    constraints: dict
+    custom: dict  # Full field descriptor (jdbc_type, db_column_name etc.)
+    description: str = None
+
+    @property
+    def required(self):
+        return bool(self.constraints.get("required", False))
+
+
+@dataclass
+class SchemaInfo:
+    fields: list
+    primary_key: list = dc_field(default_factory=list)
+    foreign_keys: list = dc_field(default_factory=list)
+
+
+@dataclass
+class ResourceInfo:
+    name: str
+    path: str
+    custom: dict  # Full resource descriptor (db_table_name, count_of_rows etc.)
+    schema: SchemaInfo
+
+
+@dataclass
+class PackageInfo:
+    name: str
+    resources: list
+
+
+def parse_package(descriptor):
+    """
+    Lightweight read only version of frictionless package
+    """
+    resources = []
+    for res in descriptor.get("resources", []):
+        schema = res.get("schema", {})
+        fields = [
+            FieldInfo(
+                name=fld["name"],
+                type=fld.get("type", "any"),
+                constraints=fld.get("constraints", {}),
+                custom=fld,
+                description=fld.get("description"),
+            ) for fld in schema.get("fields", [])
+        ]
+
+        primary_key = schema.get("primaryKey", [])
+        if isinstance(primary_key, str):
+            primary_key = [primary_key]
+
+        foreign_keys = []
+        for fk in schema.get("foreignKeys", []):
+            fk_fields = fk["fields"]
+            ref_fields = fk["reference"]["fields"]
+            foreign_keys.append({
+                "fields": [fk_fields] if isinstance(fk_fields, str) else fk_fields,
+                "reference": {
+                    "resource": fk["reference"].get("resource", ""),
+                    "fields": [ref_fields] if isinstance(ref_fields, str) else ref_fields,
+                },
+            })
+
+        resources.append(
+            ResourceInfo(
+                name=res["name"],
+                path=res.get("path", ""),
+                custom=res,
+                schema=SchemaInfo(fields=fields, primary_key=primary_key, foreign_keys=foreign_keys),
+            ))
+
+    return PackageInfo(name=descriptor.get("name", ""), resources=resources)
+
+
+def get_package(schema_path):
+    """
+    Get parsed datapackage.json, cached by path, mtime and size
+    """
+    schema_path = Path(schema_path).resolve()
+    stat = schema_path.stat()
+    key = (stat.st_mtime_ns, stat.st_size)
+
+    cached = PACKAGES.get(schema_path)
+    if cached and cached[0] == key:
+        return cached[1]
+
+    with open(schema_path) as f:
+        package = parse_package(json.load(f))
+
+    PACKAGES[schema_path] = (key, package)
+    return package
+
+
 def get_source_query(table, columns_dict, cfg):
     fixed_columns = ", ".join(columns_dict.values())
     if cfg.command == "copy":
@@ -82,70 +211,70 @@ def get_source_query(table, columns_dict, cfg):
     return f"SELECT {fixed_columns} from {source_table_name};"
 
 
-def write_field(engine, field):
+def write_field(field):
     """Convert frictionless field to sqlalchemy type
     as e.g. Field(type=string) -> sa.Text
     """
 
-    sapg = platform.sqlalchemy_dialects_postgresql
-
-    # Default dialect:
-    mapping: Dict[str, Type[TypeEngine]] = {
-        "any": sa.Text,
-        "boolean": sa.Boolean,
-        "date": sa.Date,
-        "datetime": sa.DateTime,
-        "integer": sa.Integer,
-        #"number": sa.Float,
-        "number": sa.Numeric,
-        "string": sa.Text,
-        "time": sa.Time,
-        "year": sa.Integer,
-    }
+    type = SA_TYPES.get(field.type, sa.Text)
 
-    # Postgresql dialect:
-    if engine.dialect.name.startswith("postgresql"):
-        mapping.update({
-            "array": sapg.JSONB,
-            "geojson": sapg.JSONB,
-            "number": sa.Numeric,
-            "object": sapg.JSONB,
-        })
+    # Sizes from column profile:
+    precision = field.custom.get("db_precision")
+    if precision:
+        if field.type == "integer" and precision > 9:
+            type = sa.BigInteger
+        elif field.type == "number":
+            type = sa.Numeric(precision, field.custom.get("db_scale") or 0)
 
-    type = mapping.get(field.type, sa.Text)
     return type
 
 
-def write_table(engine, schema, fk, *, table_name):
-    """Convert frictionless schema to sqlalchemy table"""
+def write_string_type(length):
+    """String type with max length per dialect (the generic type is used for iso sql)"""
+    return (sa.VARCHAR(length=length).with_variant(sa.Text(), "access").with_variant(
+        sa.CLOB() if length > 4000 else VARCHAR2(length=length),
+        "oracle").with_variant(sa.NVARCHAR(length=length if length <= 4000 else None), "mssql"))
+
+
+class RegexpMatch(ColumnElement):
+    """Regexp check rendered per dialect"""
+    inherit_cache = True
+
+    def __init__(self, column_name, pattern):
+        self.column_name = column_name
+        self.pattern = pattern
+
+
+@compiles(RegexpMatch)
+def _compile_regexp(element, compiler, **kw):
+    return "%s REGEXP '%s'" % (compiler.preparer.quote(element.column_name), element.pattern)
+
+
+@compiles(RegexpMatch, "postgresql")
+def _compile_regexp_postgresql(element, compiler, **kw):
+    return "%s ~ '%s'" % (compiler.preparer.quote(element.column_name), element.pattern)
+
+
+def write_table(meta, schema, *, table_name, dialect_name=""):
+    """Convert frictionless schema to sqlalchemy table (with type variants for all supported dialects)"""
     columns = []
     constraints = []
 
     # Fields:
     Check = sa.CheckConstraint
-    quote = engine.dialect.identifier_preparer.quote  # type: ignore
     for field in schema.fields:
         checks = []
         nullable = not field.required
-        quoted_name = quote(field.name)
-        column_type = write_field(engine, field)
+        column_type = write_field(field)
         unique = field.constraints.get("unique", False)
         # https://stackoverflow.com/questions/1827063/mysql-error-key-specification-without-a-key-length
-        if engine.dialect.name.startswith("mysql"):
+        if dialect_name.startswith("mysql"):
             unique = unique and field.type != "string"
         for const, value in field.constraints.items():
             # if const == "minLength":
             # checks.append(Check("LENGTH(%s) >= %s" % (quoted_name, value)))
             if const == "maxLength":
-                for prefix in ["mysql", "db2", "ibm", "sqlite", "postgresql"]:
-                    if engine.dialect.name.startswith(prefix):
-                        column_type = sa.VARCHAR(length=value)
-
-                if engine.dialect.name.startswith("oracle"):
-                    if value > 4000:
-                        column_type = sa.CLOB()
-                    else:
-                        column_type = VARCHAR2(length=value)
+                column_type = write_string_type(value)
 
                 # checks.append(Check("LENGTH(%s) <= %s" % (quoted_name, value)))
             # elif const == "minimum":
@@ -153,11 +282,7 @@ def write_table(engine, schema, fk, *, table_name):
             # elif const == "maximum":
             # checks.append(Check("%s <= %s" % (quoted_name, value)))
             elif const == "pattern":
-                if engine.dialect.name.startswith("postgresql"):
-                    checks.append(Check("%s ~ '%s'" % (quoted_name, value)))
-                else:
-                    check = Check("%s REGEXP '%s'" % (quoted_name, value))
-                    checks.append(check)
+                checks.append(Check(RegexpMatch(field.name, value)))
             elif const == "enum":
                 # NOTE: https://github.com/frictionlessdata/frictionless-py/issues/778
                 if field.type == "string":
@@ -174,19 +299,141 @@ def write_table(engine, schema, fk, *, table_name):
         constraint = sa.PrimaryKeyConstraint(*schema.primary_key)
         constraints.append(constraint)
 
-    if fk:
-        for fk in schema.foreign_keys:
-            fields = fk["fields"]
-            foreign_fields = fk["reference"]["fields"]
-            foreign_table_name = fk["reference"]["resource"] or table_name
-            foreign_fields = list(map(lambda field: ".".join([foreign_table_name, field]), foreign_fields))
-            constraint = sa.ForeignKeyConstraint(fields, foreign_fields)
-            constraints.append(constraint)
+    for fk in schema.foreign_keys:
+        fields = fk["fields"]
+        foreign_fields = fk["reference"]["fields"]
+        foreign_table_name = fk["reference"]["resource"] or table_name
+        foreign_fields = list(map(lambda field: ".".join([foreign_table_name, field]), foreign_fields))
+        constraint = sa.ForeignKeyConstraint(fields, foreign_fields)
+        constraints.append(constraint)
 
-    table = sa.Table(table_name, sa.MetaData(engine), *(columns + constraints))
+    table = sa.Table(table_name, meta, *(columns + constraints))
     return table
 
 
+def get_schema_columns(config_db):
+    """
+    Get fields per table for all included tables in one query
+    """
+    fields = {}
+    for row in config_db.query("""
+            SELECT c.source_table,
+                   c.source_column,
+                   c.norm_column,
+                   c.jdbc_data_type,
+                   c.source_column_size,
+                   c.fixed_size,
+                   s.null_count,
+                   s.max_length,
+                   s.precision,
+                   s.scale,
+                   s.complete
+            FROM columns c
+              INNER JOIN tables t
+                      ON t.source_name = c.source_table
+                     AND t.source_row_count > 0
+                     AND t.include = 1
+              LEFT JOIN column_stats s
+                     ON s.tbl_col_pos = c.tbl_col_pos
+            ORDER BY c.rowid
+            """):
+        fields.setdefault(row["source_table"], []).append(row)
+
+    return fields
+
+
+def get_schema_foreign_keys(config_db):
+    """
+    Get enabled foreign keys per table for all tables in one query
+    """
+    foreign_keys = {}
+    for row in config_db.query("""
+            SELECT c.source_table,
+                   c.norm_column,
+                   f.source_ref_table,
+                   f.source_ref_column
+            FROM foreign_keys f
+              INNER JOIN columns c
+                      ON c.source_column = f.source_column
+                     AND c.source_table = f.source_table
+            WHERE f.is_enabled = True
+            ORDER BY f.rowid
+            """):
+        foreign_keys.setdefault(row["source_table"], []).append(row)
+
+    return foreign_keys
+
+
+def get_field(row, source_pk, pk, cfg):
+    """
+    Convert column metadata to datapackage field descriptor
+    """
+    source_column = str(row["source_column"])
+    norm_column = str(row["norm_column"])
+    jdbc_data_type = int(row["jdbc_data_type"])
+    db_type = db.get_type("jdbc_no", "datapackage", jdbc_data_type)
+    source_column_size = int(row["source_column_size"])
+    profiled = row["complete"] == 1  # Only tighten constraints from profiles of all rows
+    field = {
+        "name": norm_column,
+        "type": db_type,
+        "jdbc_type": str(jdbc_data_type),
+        "db_column_name": source_column,
+    }
+
+    if profiled and db_type in ("integer", "number") and row["precision"]:
+        if db_type == "number" and row["scale"] == 0 and row["precision"] <= 18:
+            field["type"] = "integer"  # Whole numbers only in numeric/decimal column
+
+        field["db_precision"] = row["precision"]
+        field["db_scale"] = row["scale"]
+
+    constr = {"constraints": {}}
+
+    if jdbc_data_type in (-16, -15, -9, -8, -1, 1, 12, 2005, 2009, 2011):
+        undetectable = jdbc_data_type == -1 and cfg.source.type == "oracle"
+        if profiled and row["max_length"] > 0 and int(row["fixed_size"]) == 0:  # Keep lengths measured in source db
+            source_column_size = int(row["max_length"])  # Utf-8 bytes
+            undetectable = False
+
+        constr["constraints"]["maxLength"] = source_column_size
+
+        # Don't apply constraint for empty columns (source_column_size = 0)
+        # Potentially untrue for cases like long in oracle with undetectable size
+        if source_column_size > 0 and not undetectable:
+            field.update(constr)
+
+    if profiled and row["null_count"] == 0:
+        constr["constraints"]["required"] = True
+        field.update(constr)
+
+    if source_column == source_pk:
+        constr["constraints"]["required"] = True
+        pk.append(norm_column)
+        field.update(constr)
+
+    return field
+
+
+def write_package(schema_path, header, resources):
+    """
+    Write datapackage.json, one resource at a time
+    """
+    part_path = Path(str(schema_path) + ".part")  # Renamed when complete so a failed run leaves no truncated file
+    with open(part_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(header, indent=2, ensure_ascii=False)[:-2] + ',\n  "resources": [')
+        first = True
+        for resource in resources:
+            resource_json = json.dumps(resource, indent=2, ensure_ascii=False).replace("\n", "\n    ")
+            f.write(("" if first else ",") + "\n    " + resource_json)
+            first = False
+
+        f.write("\n  ]\n}\n")
+
+    os.replace(part_path, schema_path)
+    PACKAGES.pop(Path(schema_path).resolve(), None)
+
+
 def create_schema(cfg, changed, tables=[], schema_path=None):
     if schema_path is None:
         schema_path = Path(cfg.content_dir, "datapackage.json")
@@ -204,131 +451,82 @@ def create_schema(cfg, changed, tables=[], schema_path=None):
         gui.print_msg("Datapackage.json already generated.", style=gui.style.info)
         return schema_path
 
-    if schema_path.is_file():
-        schema_path.unlink()
-
     if len(tables) == 0:
         gui.print_msg("Generating datapackage.json...", style=gui.style.info)
 
-    package = Package(
-        name=cfg.content_dir.name,
-        profile="tabular-data-package",
-        resources=[],
-    )
-
     norm_tables = configdb.get_norm_tables(cfg.config_db)
     norm_columns = configdb.get_norm_columns(cfg.config_db)
-    for row in cfg.config_db.query("""
-            SELECT source_name,
-                   norm_name,
-                   source_pk,
-                   source_row_count,
-                   empty_rows,
-                   deps
-            FROM tables
-            WHERE source_row_count > 0
-            AND   include = 1
-            ORDER BY deps_order ASC
-            """):
-        source_table = str(row["source_name"])
-        norm_table = str(row["norm_name"])
-        source_pk = str(row["source_pk"])
-        deps = str(row["deps"])
-
-        row_count = int(row["source_row_count"])
-        empty_rows = int(row["empty_rows"])
-        row_count = str(row_count - empty_rows)
-
-        if len(tables) > 0 and source_table not in tables:
-            continue
-
-        pk = []
-        fields = []
-        for row in cfg.config_db.query(f"""
-                SELECT source_column,
-                       norm_column,
-                       jdbc_data_type,
-                       source_column_size
-                FROM columns
-                WHERE source_table = '{source_table}'
+    table_fields = get_schema_columns(cfg.config_db)
+    table_fks = get_schema_foreign_keys(cfg.config_db)
+
+    def get_resources():  # Built while written
+        for row in cfg.config_db.query("""
+                SELECT source_name,
+                       norm_name,
+                       source_pk,
+                       source_row_count,
+                       empty_rows,
+                       deps
+                FROM tables
+                WHERE source_row_count > 0
+                AND   include = 1
+                ORDER BY deps_order ASC
                 """):
-            source_column = str(row["source_column"])
-            norm_column = str(row["norm_column"])
-            jdbc_data_type = int(row["jdbc_data_type"])
-            db_type = db.get_type("jdbc_no", "datapackage", jdbc_data_type)
-            source_column_size = int(row["source_column_size"])
-            field = {
-                "name": norm_column,
-                "type": db_type,
-                "jdbc_type": str(jdbc_data_type),
-                "db_column_name": source_column,
-            }
+            source_table = str(row["source_name"])
+            norm_table = str(row["norm_name"])
+            source_pk = str(row["source_pk"])
+            deps = str(row["deps"])
 
-            constr = {"constraints": {}}
+            row_count = int(row["source_row_count"])
+            empty_rows = int(row["empty_rows"])
+            row_count = str(row_count - empty_rows)
 
-            if jdbc_data_type in (-16, -15, -9, -8, -1, 1, 12, 2005, 2009, 2011):
-                constr["constraints"]["maxLength"] = source_column_size
-
-                # Don't apply constraint for empty columns (source_column_size = 0)
-                # Potentially untrue for cases like long in oracle with undetectable size
-                if source_column_size > 0 and not (jdbc_data_type == -1 and cfg.source.type == "oracle"):
-                    field.update(constr)
-
-            if source_column == source_pk:
-                constr["constraints"]["required"] = True
-                pk.append(norm_column)
-                field.update(constr)
-
-            fields.append(field)
-
-        table_descr = {"fields": fields}
-        if pk:
-            table_descr.update({"primaryKey": pk})
-
-        foreign_keys = []
-        for row in cfg.config_db.query(f"""
-                SELECT c.norm_column,
-                       f.source_ref_table,
-                       f.source_ref_column
-                FROM foreign_keys f
-                  LEFT JOIN columns c
-                         ON c.source_column = f.source_column
-                        AND c.source_table = f.source_table
-                WHERE c.source_table = '{source_table}' AND f.is_enabled = True
-                """):
-            source_ref_table = str(row["source_ref_table"])
-            if source_ref_table not in norm_tables:
+            if len(tables) > 0 and source_table not in tables:
                 continue
 
-            target_table = norm_tables[source_ref_table]
-            if target_table == norm_table:
-                target_table = ""
-
-            foreign_keys.append({
-                "fields": str(row["norm_column"]),
-                "reference": {
-                    "resource": target_table,
-                    "fields": norm_columns[source_ref_table + ":" + str(row["source_ref_column"])],
-                },
-            })
-
-        if foreign_keys:
-            table_descr.update({"foreignKeys": foreign_keys})
+            pk = []
+            fields = [get_field(col, source_pk, pk, cfg) for col in table_fields.get(source_table, [])]
+
+            table_descr = {"fields": fields}
+            if pk:
+                table_descr.update({"primaryKey": pk})
+
+            foreign_keys = []
+            for fk in table_fks.get(source_table, []):
+                source_ref_table = str(fk["source_ref_table"])
+                if source_ref_table not in norm_tables:
+                    continue
+
+                target_table = norm_tables[source_ref_table]
+                if target_table == norm_table:
+                    target_table = ""
+
+                foreign_keys.append({
+                    "fields": [str(fk["norm_column"])],
+                    "reference": {
+                        "resource": target_table,
+                        "fields": [norm_columns[source_ref_table + ":" + str(fk["source_ref_column"])]],
+                    },
+                })
+
+            if foreign_keys:
+                table_descr.update({"foreignKeys": foreign_keys})
+
+            resource = {
+                "name": norm_table,
+                "profile": "tabular-data-resource",
+                "path": str(Path("data", norm_table + ".tsv")),
+                "encoding": "UTF-8",
+                "db_table_name": source_table,
+                "db_table_deps": deps,
+                "count_of_rows": str(row_count),
+                "schema": table_descr,
+                "dialect": dialect,
+            }
 
-        resource = Resource({
-            "name": norm_table,
-            "profile": "tabular-data-resource",
-            "path": str(Path("data", norm_table + ".tsv")),
-            "encoding": "UTF-8",
-            "db_table_name": source_table,
-            "db_table_deps": deps,
-            "count_of_rows": str(row_count),
-            "schema": table_descr,
-            "dialect": dialect,
-        })
-        package.add_resource(resource)
+            yield resource
 
-    package.to_json(schema_path)
+    write_package(schema_path, {"name": cfg.content_dir.name, "profile": "tabular-data-package"}, get_resources())
 
     if cfg.stop == "json":
         gui.show(cfg, schema_path)
@@ -336,57 +534,77 @@ def create_schema(cfg, changed, tables=[], schema_path=None):
     return schema_path
 
 
-def create_ddl(schema_path, changed, cfg):
-    jdbc = cfg.target
-    ddl_file = Path(cfg.content_dir, jdbc.type + "-ddl.sql")
-    ddl_fk_file = Path(cfg.content_dir, jdbc.type + "-fk-ddl.sql")
-    files = [ddl_fk_file]
+def get_dialect(db_type):
+    """
+    Get sqlalchemy dialect for database type
+    """
 
-    if cfg.target.type != "sqlite":
-        files.append(ddl_file)
+    def _dump(sql, *multiparams, **params):
+        pass
 
-    for fil in files:
-        if fil.is_file() and cfg.stop != "ddl" and not changed:
-            gui.print_msg("DDL for schema already generated.", style=gui.style.info)
-        else:
-            if not schema_path.is_file():
-                gui.print_msg("JSON schema-file '" + str(schema_path) + "' missing. Aborted", exit=True)
+    dialect_name = DDL_DIALECTS.get(db_type, db_type)
+    if dialect_name is None:
+        return DefaultDialect()
 
-            def _dump(sql, *multiparams, **params):
-                pass
+    return sa.create_engine("%s://" % dialect_name, strategy="mock", executor=_dump).dialect
 
-            gui.print_msg("Generating DDL from datapackage json schema...", style=gui.style.info)
 
-            if jdbc.type == "h2":
-                jdbc.type = "postgresql"
+def write_ddl(fil, statements):
+    with open(fil, "w") as f:
+        for statement in statements:
+            lines = [line for line in str(statement).splitlines()]
+            f.write("\n".join([line for line in lines if line.strip()]) + ";\n\n")
 
-            if fil.is_file():
-                fil.unlink()
 
-            fk = False
-            if fil == ddl_fk_file:
-                fk = True
+def create_ddl(schema_path, changed, cfg):
+    db_type = cfg.target.type
+    ddl_file = Path(cfg.content_dir, db_type + "-ddl.sql")
+    ddl_fk_file = Path(cfg.content_dir, db_type + "-fk-ddl.sql")
+    ddl_constraints_file = Path(cfg.content_dir, db_type + "-constraints-ddl.sql")
+    files = [ddl_fk_file]
 
-            tables = []
-            meta = sa.MetaData()
-            engine = sa.create_engine("%s://" % jdbc.type, strategy="mock", executor=_dump)
-            with open(schema_path) as f:
-                package = Package(json.load(f))
-                for res in package.resources:
-                    table = write_table(engine, res.schema, fk, table_name=res.name)
-                    table = table.to_metadata(meta)
-                    tables.append(table)
+    if db_type != "sqlite":  # Alter table add constraint not supported in sqlite
+        files.extend([ddl_file, ddl_constraints_file])
 
-            with open(fil, "a") as f:
-                for table in meta.sorted_tables:
-                    tbl_ddl = CreateTable(table, if_not_exists=True).compile(engine)
-                    lines = [line for line in str(tbl_ddl).splitlines()]
-                    f.write("\n".join([line for line in lines if line.strip()]) + ";\n\n")
+    extra_types = [x for x in (cfg.ddl_dialects or []) if x != db_type]
+    files.extend([Path(cfg.content_dir, x + "-fk-ddl.sql") for x in extra_types])
+
+    if all(fil.is_file() for fil in files) and cfg.stop != "ddl" and not changed:
+        gui.print_msg("DDL for schema already generated.", style=gui.style.info)
+    else:
+        if not schema_path.is_file():
+            gui.print_msg("JSON schema-file '" + str(schema_path) + "' missing. Aborted", exit=True)
+
+        gui.print_msg("Generating DDL from datapackage json schema...", style=gui.style.info)
+
+        dialect = get_dialect(db_type)
+        meta = sa.MetaData()  # One model for all ddl variants and dialects
+        for res in get_package(schema_path).resources:
+            write_table(meta, res.schema, table_name=res.name, dialect_name=dialect.name)
+
+        tables = meta.sorted_tables
+        write_ddl(ddl_fk_file, [CreateTable(table, if_not_exists=True).compile(dialect=dialect) for table in tables])
+
+        for extra_type in extra_types:
+            extra_dialect = get_dialect(extra_type)
+            write_ddl(Path(cfg.content_dir, extra_type + "-fk-ddl.sql"),
+                      [CreateTable(table, if_not_exists=True).compile(dialect=extra_dialect) for table in tables])
+
+        # Compiled last, as AddConstraint disables inline foreign keys in later CreateTable of the shared model:
+        if db_type != "sqlite":
+            write_ddl(ddl_file, [
+                CreateTable(table, include_foreign_key_constraints=[], if_not_exists=True).compile(dialect=dialect)
+                for table in tables
+            ])
+            write_ddl(ddl_constraints_file, [
+                AddConstraint(constraint).compile(dialect=dialect) for table in tables
+                for constraint in table.foreign_key_constraints
+            ])
 
     if cfg.stop == "ddl":
         gui.show(cfg, ddl_fk_file)
 
-    if cfg.target.type == "sqlite":
+    if db_type == "sqlite":
         return ddl_fk_file
 
     return ddl_file
@@ -0,0 +1,74 @@
+# Copyright (C) 2023 Morten Eek
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import sqlite3
+
+from validator import get_keys_path, get_key_table, get_columns, create_index
+
+MAX_VIOLATIONS = 10  # Reported per constraint
+CACHE_KB = 64 * 1024  # Page cache per check, temporary b-trees spill to disk beyond this
+
+
+def check_table(resource, keys_dir, max_violations=MAX_VIOLATIONS):
+    """
+    Check foreign keys of resource against key stores of referenced tables. Returns list of violations.
+    """
+    errors = []
+    conn = sqlite3.connect(get_keys_path(keys_dir, resource.name))
+    conn.execute("PRAGMA cache_size = -" + str(CACHE_KB))
+    conn.execute("PRAGMA temp_store = FILE")
+    try:
+        for fk in resource.schema.foreign_keys:
+            errors.extend(check_constraint(conn, resource.name, fk, keys_dir, max_violations))
+    finally:
+        conn.close()
+
+    return errors
+
+
+def check_constraint(conn, table_name, fk, keys_dir, max_violations):
+    """
+    Probe distinct child keys against an index on the referenced keys (built on first use)
+    """
+    fields = fk["fields"]
+    ref_name = fk["reference"]["resource"] or table_name
+    ref_fields = fk["reference"]["fields"]
+    constraint = table_name + "(" + ", ".join(fields) + ") -> " + ref_name + "(" + ", ".join(ref_fields) + ")"
+
+    ref_path = get_keys_path(keys_dir, ref_name)
+    if not ref_path.is_file():
+        return ["Foreign key " + constraint + ": keys of referenced table not exported"]
+
+    conn.execute("ATTACH DATABASE ? AS ref", (str(ref_path), ))
+    try:
+        create_index(conn, ref_fields, schema="ref")
+        conn.commit()
+
+        condition = " AND ".join('r."' + ref + '" = c."' + field + '"' for field, ref in zip(fields, ref_fields))
+        violations = conn.execute("SELECT DISTINCT " + get_columns(fields, "c.") + ' FROM main."' +
+                                  get_key_table(fields) + '" c WHERE NOT EXISTS (SELECT 1 FROM ref."' +
+                                  get_key_table(ref_fields) + '" r WHERE ' + condition + ") LIMIT " +
+                                  str(max_violations + 1)).fetchall()
+    finally:
+        conn.execute("DETACH DATABASE ref")
+
+    errors = []
+    for row in violations[:max_violations]:
+        errors.append("Foreign key " + constraint + ": " + str(row) + " not found")
+
+    if len(violations) > max_violations:
+        errors.append("Foreign key " + constraint + ": more than " + str(max_violations) + " violations")
+
+    return errors
@@ -24,6 +24,8 @@ from functools import reduce
 from dateutil.parser import parse as dt_parse
 import datetime
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import configdb
 from sqlite_utils import Database
@@ -425,7 +427,7 @@ class Dbo:
                 yield transformer(result)
                 if (max_rows > 0) and (row_count >= max_rows):
                     self.close(cursor)
-                    break
+                    return
 
     @default_cursor([])
     def commit(self, cursor=None):
@@ -804,6 +806,22 @@ def get_conn(login, cfg):
     return dbo
 
 
+def get_local_conn(local, conns, cfg):
+    """
+    Get connection of worker thread, opened on first use and closed by caller
+    """
+    if not hasattr(local, "dbo"):
+        local.dbo = get_conn(cfg.source.url.replace('"', ""), cfg)
+        conns.append(local.dbo)
+
+    return local.dbo
+
+
+def close_conns(conns):
+    for dbo in conns:
+        dbo.connection.close()
+
+
 def get_tables(jdbc, cfg):
     dbo = get_conn(jdbc.url.replace('"', ""), cfg)
     conn = dbo.connection
@@ -1020,6 +1038,37 @@ def get_all_tables_count(jdbc, cfg, keys=True):
     return configdb.get_tables_count(jdbc, cfg)
 
 
+def get_max_lengths(source_table, source_columns, local, conns, cfg):
+    """
+    Get max length of all given columns in table with one table scan
+    """
+    jdbc = cfg.source
+
+    length_func = "LENGTH"
+    if jdbc.type == "sqlserver":
+        length_func = "Datalength"
+
+    selects = []
+    for source_column in source_columns:
+        if jdbc.type == "sqlite":
+            source_column = 'CAST("' + source_column + '" AS BLOB)'
+        elif " " in source_column:
+            source_column = '"' + source_column + '"'
+
+        selects.append("MAX(" + length_func + "(" + source_column + "))")
+
+    table = source_table
+    if " " in table:
+        table = '"' + table + '"'
+    if cfg.schema:
+        table = cfg.schema + "." + table
+
+    dbo = get_local_conn(local, conns, cfg)  # One connection per worker thread
+    row = dbo.query_single("SELECT " + ", ".join(selects) + " FROM " + table)
+
+    return source_table, [str(value or 0) for value in row]
+
+
 def fix_columns_rows(tables, first_run, cfg):
     if first_run:
         configdb.connect_column_fk(cfg)
@@ -1028,47 +1077,57 @@ def fix_columns_rows(tables, first_run, cfg):
     jdbc = cfg.source
     conn = jdbc.connection
 
-    length_func = "LENGTH"
-    if jdbc.type == "sqlserver":
-        length_func = "Datalength"
-
-    fixed = {}
+    table_columns = {}
     for row in cfg.config_db["columns"].rows:
         source_table = str(row["source_table"])
         if (source_table in tables and int(row["fixed_size"]) == 0
                 and int(row["jdbc_data_type"]) in (-16, -15, -9, -8, -1, 1, 12, 2005, 2009, 2011)
                 and int(row["source_column_size"]) > 4000):
+            table_columns.setdefault(source_table, []).append(row)
+
+    max_lengths = {}
+    local = threading.local()
+    conns = []
+    try:
+        with ThreadPoolExecutor(max_workers=cfg.jobs) as executor:
+            futures = [
+                executor.submit(get_max_lengths, source_table, [str(row["source_column"]) for row in rows], local,
+                                conns, cfg) for source_table, rows in table_columns.items()
+            ]
+            for future in as_completed(futures):
+                source_table, lengths = future.result()
+                gui.print_overwrite(source_table)
+                max_lengths[source_table] = lengths
+    finally:
+        close_conns(conns)
 
-            gui.print_overwrite(source_table)
-
-            if " " in source_table:
-                source_table = '"' + source_table + '"'
-
-            source_column = str(row["source_column"])
-            if jdbc.type == "sqlite":
-                source_column = 'CAST("' + source_column + '" AS BLOB)'
-            elif " " in source_column:
-                source_column = '"' + source_column + '"'
-
-            max_length = str(
-                jdbc.query_single_value("SELECT MAX(" + length_func + "(" + source_column + ")) FROM " + source_table)
-                or 0)
-            cfg.config_db["columns"].update(row["tbl_col_pos"], {"source_column_size": max_length, "fixed_size": 1})
-            fixed[str(row["tbl_col_pos"])] = max_length  # Undetectable column lengths (eg oracle long) are saved as -1
-
-    for row in cfg.config_db["foreign_key"].rows:
-        tbl_col_pos = str(row["tbl_col_pos"])
-        ref_tbl_col_pos = str(row["ref_tbl_col_pos"])
-        if tbl_col_pos in fixed:
-            max_length = int(fixed[tbl_col_pos])
-            ref_max_length = int(cfg.config_db["columns"].get(ref_tbl_col_pos)["source_column_size"])
-
-            if ref_max_length == max_length:
-                continue
-
-            if ref_max_length > max_length:
-                cfg.config_db["columns"].update(tbl_col_pos, {"source_column_size": ref_max_length})
-            else:
-                cfg.config_db["columns"].update(ref_tbl_col_pos, {"source_column_size": max_length})
+    fixed = {}
+    updates = []
+    for source_table, rows in table_columns.items():
+        for row, max_length in zip(rows, max_lengths[source_table]):
+            # Undetectable column lengths (eg oracle long) are saved as -1
+            updates.append((max_length, row["tbl_col_pos"]))
+            fixed[str(row["tbl_col_pos"])] = max_length
+
+    with cfg.config_db.conn:  # Write all results in one transaction
+        cfg.config_db.conn.executemany(
+            "UPDATE columns SET source_column_size = ?, fixed_size = 1 WHERE tbl_col_pos = ?", updates)
+
+        for row in cfg.config_db["foreign_keys"].rows:
+            tbl_col_pos = str(row["tbl_col_pos"])
+            ref_tbl_col_pos = str(row["ref_tbl_col_pos"])
+            if tbl_col_pos in fixed:
+                max_length = int(fixed[tbl_col_pos])
+                ref_max_length = int(cfg.config_db["columns"].get(ref_tbl_col_pos)["source_column_size"])
+
+                if ref_max_length == max_length:
+                    continue
+
+                if ref_max_length > max_length:
+                    cfg.config_db.conn.execute("UPDATE columns SET source_column_size = ? WHERE tbl_col_pos = ?",
+                                               (ref_max_length, tbl_col_pos))
+                else:
+                    cfg.config_db.conn.execute("UPDATE columns SET source_column_size = ? WHERE tbl_col_pos = ?",
+                                               (max_length, ref_tbl_col_pos))
 
     conn.close()
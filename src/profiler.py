@@ -0,0 +1,196 @@
+# Copyright (C) 2023 Morten Eek
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import math
+import hashlib
+import threading
+from decimal import Decimal, InvalidOperation
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import gui
+import jdbc
+
+BINARY_TYPES = (-4, -3, -2, 2004)  # Not profiled (would pull all blobs through jdbc)
+EXACT_NUMERIC_TYPES = (-6, -5, 2, 3, 4, 5)  # Returned by jaydebeapi as int, float or string of java object
+
+
+class HyperLogLog:
+    """
+    Distinct count estimate in fixed memory (2^p registers)
+    """
+
+    def __init__(self, p=14):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+        self.alpha = 0.7213 / (1 + 1.079 / self.m)
+
+    def add(self, value):
+        x = int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "big")
+        idx = x >> (64 - self.p)
+        rest = x & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def count(self):
+        estimate = self.alpha * self.m * self.m / sum(2.0**-r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.m and zeros > 0:  # Small range correction
+            estimate = self.m * math.log(self.m / zeros)
+
+        return int(round(estimate))
+
+
+class ColumnProfile:
+    """
+    Statistics for one column, updated one value at a time. Lengths are in utf-8 bytes.
+    """
+
+    def __init__(self, exact_numeric=False):
+        self.exact_numeric = exact_numeric
+        self.row_count = 0
+        self.null_count = 0
+        self.max_length = 0
+        self.min_value = None
+        self.max_value = None
+        self.int_digits = 0
+        self.scale = 0
+        self.numeric = exact_numeric
+        self.hll = HyperLogLog()
+
+    def add(self, value):
+        self.row_count += 1
+        if value is None or (isinstance(value, str) and value.strip() == ""):  # Trimmed to null on export
+            self.null_count += 1
+            return
+
+        self.hll.add(value)
+
+        if self.exact_numeric and self.numeric:
+            try:
+                number = Decimal(str(value)).normalize()
+            except InvalidOperation:
+                number = None
+
+            if number is None or isinstance(value, bool) or not number.is_finite():
+                self.numeric = False
+            else:
+                value = number  # Compare min/max as numbers
+                sign, digits, exponent = number.as_tuple()
+                self.scale = max(self.scale, -exponent)
+                self.int_digits = max(self.int_digits, len(digits) + exponent)
+
+        if isinstance(value, bytes):
+            self.max_length = max(self.max_length, len(value))
+        else:
+            self.max_length = max(self.max_length, len(str(value).encode("utf-8")))
+
+        try:
+            if self.min_value is None or value < self.min_value:
+                self.min_value = value
+            if self.max_value is None or value > self.max_value:
+                self.max_value = value
+        except TypeError:  # Mixed types in column
+            pass
+
+    def to_dict(self):
+        return {
+            "row_count": self.row_count,
+            "null_count": self.null_count,
+            "distinct_count": self.hll.count(),
+            "max_length": self.max_length,
+            "min_value": None if self.min_value is None else str(self.min_value),
+            "max_value": None if self.max_value is None else str(self.max_value),
+            "precision": max(1, self.int_digits + self.scale) if self.numeric else None,
+            "scale": self.scale if self.numeric else None,
+        }
+
+
+def profile_table(source_table, source_columns, jdbc_types, row_count, local, conns, cfg):
+    """
+    Profile columns of one table in a single streaming pass (or on the first cfg.sample rows)
+    """
+    selects = []
+    for source_column in source_columns:
+        selects.append('"' + source_column + '"' if " " in source_column else source_column)
+
+    table = '"' + source_table + '"' if " " in source_table else source_table
+    if cfg.schema:
+        table = cfg.schema + "." + table
+
+    profiles = [ColumnProfile(jdbc_type in EXACT_NUMERIC_TYPES) for jdbc_type in jdbc_types]
+    dbo = jdbc.get_local_conn(local, conns, cfg)  # One connection per worker thread
+    for row in dbo.query("SELECT " + ", ".join(selects) + " FROM " + table, max_rows=cfg.sample, array_size=10000):
+        for profile, value in zip(profiles, row):
+            profile.add(value)
+
+    complete = int(cfg.sample == 0 or cfg.sample >= row_count)
+    return source_table, [profile.to_dict() | {"complete": complete} for profile in profiles]
+
+
+def run(tables, cfg):
+    """
+    Profile all included tables in parallel and save statistics to config database
+    """
+    msg = "Profiling columns"
+    if cfg.sample:
+        msg = msg + " (sample of " + str(cfg.sample) + " rows per table)"
+    gui.print_msg(msg + "...", style=gui.style.info)
+
+    table_columns = {}
+    for row in cfg.config_db.query("""
+            SELECT c.tbl_col_pos,
+                   c.source_table,
+                   c.source_column,
+                   c.jdbc_data_type,
+                   t.source_row_count
+            FROM columns c
+              INNER JOIN tables t
+                      ON t.source_name = c.source_table
+                     AND t.source_row_count > 0
+            ORDER BY c.source_table, c.source_column_position
+            """):
+        if row["source_table"] in tables and int(row["jdbc_data_type"]) not in BINARY_TYPES:
+            table_columns.setdefault(row["source_table"], []).append(row)
+
+    stats = {}
+    local = threading.local()
+    conns = []
+    try:
+        with ThreadPoolExecutor(max_workers=cfg.jobs) as executor:
+            futures = [
+                executor.submit(profile_table, source_table, [row["source_column"] for row in rows],
+                                [int(row["jdbc_data_type"]) for row in rows], int(rows[0]["source_row_count"]), local,
+                                conns, cfg) for source_table, rows in table_columns.items()
+            ]
+            for future in as_completed(futures):
+                source_table, profiles = future.result()
+                gui.print_overwrite(source_table)
+                stats[source_table] = profiles
+    finally:
+        jdbc.close_conns(conns)
+
+    with cfg.config_db.conn:  # Write all results in one transaction
+        for source_table, rows in table_columns.items():
+            for row, profile in zip(rows, stats[source_table]):
+                cfg.config_db["column_stats"].upsert(
+                    {
+                        "tbl_col_pos": row["tbl_col_pos"],
+                        "source_table": source_table,
+                        "source_column": row["source_column"],
+                    } | profile,
+                    pk="tbl_col_pos",
+                )
@@ -27,6 +27,8 @@ import jdbc
 import gui
 import _sqlite
 
+SAMPLE_SIZE = 1000  # Files checked before giving up on directory being mostly tabular data files
+
 
 def confirm(cfg):
     for key, value in cfg.__dict__.items():
@@ -88,32 +90,59 @@ def get_target_db(target_db_path, cfg):
     return jdbc.get_conn("jdbc:sqlite:" + str(target_db_path), cfg)
 
 
+def scan_data_files(source, extensions, sample_size=SAMPLE_SIZE):
+    """
+    Walk source once and return tabular data files if they are the majority of files (None otherwise).
+    Stops early when the first sample_size files are mostly not tabular.
+    """
+    f_count = 0
+    data_files = []
+    dirs = [str(source)]
+    while dirs:
+        with os.scandir(dirs.pop()) as it:
+            entries = sorted(it, key=lambda x: x.name)
+
+        sub_dirs = []
+        for entry in entries:  # Type from directory listing, no stat needed
+            if entry.is_dir(follow_symlinks=False):
+                sub_dirs.append(entry.path)
+                continue
+
+            if not entry.is_file():
+                continue
+
+            f_count += 1
+            if Path(entry.name).suffix[1:].lower() in extensions:
+                data_files.append(entry.path)
+
+            if f_count == sample_size and len(data_files) <= f_count / 2:  # Checked once, at end of sample
+                return None
+
+        dirs.extend(reversed(sub_dirs))  # Depth first in name order
+
+    return data_files if len(data_files) > f_count / 2 else None
+
+
 def get_data_dir_db(main_cfg):
     data_files_dir = None
     source_db_path = None
     source = main_cfg.source
+    data_files = None
     if Path(source).is_dir():
-        ext_funcs = _sqlite.ext_cmds()
-        files = Path(source).rglob("*")
-        f_count = len([f for f in files if f.is_file()])
-        d_count = 0
-        for fil in Path(source).rglob("*"):
-            if fil.suffix[1:].lower() in ext_funcs.keys():
-                d_count += 1
-
-            if d_count > int(f_count / 2):
-                data_files_dir = Path(source)
-                break
+        data_files = scan_data_files(source, _sqlite.ext_cmds().keys())
+        if data_files:
+            data_files_dir = Path(source)
 
     if data_files_dir:
         project_dir = Path(main_cfg.projects_dir, main_cfg.target)
         tmp_dir = Path(project_dir, "tmp")
         source_db_path = Path(tmp_dir, project_dir.name + ".db")
-        source = "jdbc:sqlite:" + str(source_db_path)
+        tmp_dir.mkdir(parents=True, exist_ok=True)
         if not Path(source_db_path).is_file():
-            tmp_dir.mkdir(parents=True, exist_ok=True)
             Database(str(source_db_path), use_counts_table=True)
 
+        # Cache file manifest for import step:
+        Path(tmp_dir, _sqlite.DATA_FILES_MANIFEST).write_text("\n".join(sorted(data_files)) + "\n", encoding="utf-8")
         source = "jdbc:sqlite:" + str(source_db_path)
 
     return source, data_files_dir, source_db_path
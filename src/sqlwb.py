@@ -14,14 +14,13 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from pathlib import Path
-import json
 import tempfile
 
 import jpype as jp
-from frictionless import Package
 from utils import _dict
 import jdbc
 import dp
+import db
 import gui
 from sqlalchemy import create_engine
 import configdb
@@ -59,14 +58,9 @@ def get_copy_statements(json_schema_file, cfg, diff_data):
                    cfg.jdbc_drivers[cfg.target.type]["class"])
             params = params + '-preTableStatement="' + pragmas + '" '
 
-        source_type = cfg.source.type.replace("h2", "postgresql")
-        target_type = cfg.target.type.replace("h2", "postgresql")
-
-        source_type = cfg.source.type.replace("access", 'access+pyodbc')
-        target_type = cfg.target.type.replace("access", 'access+pyodbc')
-
-        source_type = cfg.source.type.replace("sqlserver", 'mssql')
-        target_type = cfg.target.type.replace("sqlserver", 'mssql')
+        # Same sqlalchemy dialect as for ddl (h2 as postgresql etc.):
+        source_type = dp.DDL_DIALECTS.get(cfg.source.type, cfg.source.type).replace("access", "access+pyodbc")
+        target_type = dp.DDL_DIALECTS.get(cfg.target.type, cfg.target.type).replace("access", "access+pyodbc")
 
         source_quote = create_engine("%s://" % source_type, strategy="mock",
                                      executor=_dump).dialect.identifier_preparer.quote
@@ -74,89 +68,43 @@ def get_copy_statements(json_schema_file, cfg, diff_data):
         target_quote = create_engine("%s://" % target_type, strategy="mock",
                                      executor=_dump).dialect.identifier_preparer.quote
 
-        with open(json_schema_file) as f:
-            package = Package(json.load(f))
-
-            for table in package.resources:
-                ddl_columns = {}
-                for field in table.schema.fields:
-                    source_column_name = field.custom["db_column_name"]
-                    target_column_name = field.name
-                    jdbc_data_type = int(field.custom["jdbc_type"])
-                    fixed_source_column_name = ""
-
-                    if cfg.no_blobs and jdbc_data_type in [-4, -3, -2, 2004]:
-                        fixed_source_column_name = ("NULL AS " + source_quote(target_column_name))
-                    elif jdbc_data_type in [91, 93] and cfg.target.type == "sqlite":
-                        if cfg.source.type == "h2":
-                            fixed_source_column_name = ("FORMATDATETIME(" + source_quote(source_column_name) +
-                                                        ",'YYYY-MM-DD HH:mm:ss') AS " +
-                                                        source_quote(target_column_name))
-                        elif cfg.source.type == "sqlite":
-                            fixed_source_column_name = ("DATETIME(SUBSTR(" + source_quote(source_column_name) +
-                                                        ",1,10), 'unixepoch') AS " + source_quote(target_column_name))
-                        elif cfg.source.type == "oracle":
-                            fixed_source_column_name = ("TO_CHAR(" + source_quote(source_column_name) +
-                                                        ",'YYYY-MM-DD HH24:MI:SS') AS " +
-                                                        source_quote(target_column_name))
-                        elif cfg.source.type == "access":
-                            fixed_source_column_name = ("FORMAT(" + source_quote(source_column_name) +
-                                                        ", 'yyyy-MM-dd HH:nn:ss') AS " +
-                                                        source_quote(target_column_name))
-                        elif cfg.source.type == "sqlserver":
-                            fixed_source_column_name = ("FORMAT(" + source_quote(source_column_name) +
-                                                        ", 'yyyy-MM-dd HH:mm:ss') AS " +
-                                                        source_quote(target_column_name))
-                        else:
-                            gui.print_msg(
-                                "Datetime to formatted string in sqlite not implemented for '" + cfg.source.type + "'",
-                                exit=True,
-                            )
-                    elif jdbc_data_type == 92 and cfg.target.type == "sqlite":
-                        if cfg.source.type == "h2":
-                            fixed_source_column_name = ("FORMATDATETIME(" + source_quote(source_column_name) +
-                                                        ",'HH:mm:ss') AS " + source_quote(target_column_name))
-                        elif cfg.source.type == "sqlite":
-                            fixed_source_column_name = ("TIME(" + source_quote(source_column_name) + ") AS " +
-                                                        source_quote(target_column_name))
-                        elif cfg.source.type == "oracle":
-                            fixed_source_column_name = ("TO_CHAR(" + source_quote(source_column_name) +
-                                                        ",'HH24:MI:SS') AS " + source_quote(target_column_name))
-                        elif cfg.source.type == "access":
-                            fixed_source_column_name = ("FORMAT(" + source_quote(source_column_name) +
-                                                        ", 'HH:nn:ss') AS " + source_quote(target_column_name))
-                        elif cfg.source.type == "sqlserver":
-                            fixed_source_column_name = ("FORMAT(" + source_quote(source_column_name) +
-                                                        ", 'hh:mm:ss') AS " + source_quote(target_column_name))
-                        else:
-                            gui.print_msg(
-                                "Time to formatted string in sqlite not implemented for '" + cfg.source.type + "'",
-                                exit=True,
-                            )
-
-                    # Un-mangle GUIDs stored in RAW columns in oracle.
-                    elif jdbc_data_type == -3 and cfg.target.type == "sqlite":
-                        if cfg.source.type == "oracle":
-                            fixed_source_column_name = ("UTL_RAW.CAST_TO_VARCHAR2(UTL_RAW.CAST_TO_RAW(" +
-                                                        source_quote(source_column_name) + ")) AS " +
-                                                        source_quote(target_column_name))
-
-                    elif source_column_name.lower() == target_column_name.lower():
-                        fixed_source_column_name = source_quote(source_column_name)
-                    else:
-                        fixed_source_column_name = (source_quote(source_column_name) + " AS " +
-                                                    source_quote(target_column_name))
-
-                    ddl_columns[target_column_name] = fixed_source_column_name
-
-                select = dp.get_source_query(table, ddl_columns, cfg)
-
-                copy_data_str = ("WbCopy " + params + '-targetConnection="username=' + cfg.target.user + ",password=" +
-                                 cfg.target.password + ",url=" + url + '" -targetTable="' + cfg.target.schema + '".' +
-                                 target_quote(table.name) + " -sourceQuery=" + select)
-
-                with open(copy_file, "a") as file:
-                    file.write("\n" + copy_data_str)
+        package = dp.get_package(json_schema_file)
+
+        for table in package.resources:
+            ddl_columns = {}
+            for field in table.schema.fields:
+                source_column_name = field.custom["db_column_name"]
+                target_column_name = field.name
+                jdbc_data_type = int(field.custom["jdbc_type"])
+                cast = db.get_cast(cfg.source.type, cfg.target.type, jdbc_data_type)
+
+                if cfg.no_blobs and jdbc_data_type in [-4, -3, -2, 2004]:
+                    fixed_source_column_name = ("NULL AS " + source_quote(target_column_name))
+                elif cast:
+                    fixed_source_column_name = (cast.replace("{column}", source_quote(source_column_name)) + " AS " +
+                                                source_quote(target_column_name))
+                elif jdbc_data_type in [91, 92, 93] and cfg.target.type == "sqlite":
+                    gui.print_msg(
+                        ("Time" if jdbc_data_type == 92 else "Datetime") +
+                        " to formatted string in sqlite not implemented for '" + cfg.source.type + "'",
+                        exit=True,
+                    )
+                elif source_column_name.lower() == target_column_name.lower():
+                    fixed_source_column_name = source_quote(source_column_name)
+                else:
+                    fixed_source_column_name = (source_quote(source_column_name) + " AS " +
+                                                source_quote(target_column_name))
+
+                ddl_columns[target_column_name] = fixed_source_column_name
+
+            select = dp.get_source_query(table, ddl_columns, cfg)
+
+            copy_data_str = ("WbCopy " + params + '-targetConnection="username=' + cfg.target.user + ",password=" +
+                             cfg.target.password + ",url=" + url + '" -targetTable="' + cfg.target.schema + '".' +
+                             target_quote(table.name) + " -sourceQuery=" + select)
+
+            with open(copy_file, "a") as file:
+                file.write("\n" + copy_data_str)
 
     if cfg.stop == "copy":
         gui.show(cfg, copy_file)
@@ -164,46 +112,58 @@ def get_copy_statements(json_schema_file, cfg, diff_data):
     return copy_file
 
 
+def run_table_ddl(batch, jdbc, cfg, tbl_ddl_file, echo):
+    return str(
+        batch.runScript(" ".join((
+            get_connect_cmd(jdbc, cfg),
+            "WbInclude",
+            "-file=" + str(tbl_ddl_file),
+            "-verbose=" + str(echo),
+            "-printStatements=" + str(cfg.debug),
+            "-encoding=UTF8;",
+            "commit; WbDisconnect;",
+        ))))
+
+
 def run_ddl_file(jdbc, cfg, diff_tables, ddl_file, echo=False):
     if not ddl_file.is_file():
         gui.print_msg("SQL file '" + str(ddl_file) + "' missing. Aborted", exit=True)
 
     gui.print_msg("Creating tables from generated DDL...", style=gui.style.info)
 
-    result = None
     norm_tables = configdb.get_norm_tables(cfg.config_db)
-    conn = get_connect_cmd(jdbc, cfg)
-    batch = get_batch()
+    created = []
+    error_table = None
+    batch = get_batch()  # One runner for all tables (embedded sql workbench is not known to be thread safe)
 
     with tempfile.TemporaryDirectory() as td:
+        ddl_files = {}
         with open(ddl_file) as fr:
-            for tbl_ddl in fr.read().split(";"):
+            for tbl_ddl in fr.read().split(";"):  # File may be edited by hand after --stop ddl
                 norm_table = tbl_ddl.partition("CREATE TABLE IF NOT EXISTS ")[2].partition(" (")[0]
                 if norm_table in norm_tables.values():
                     source_table = _dict.get_key_from_value(norm_tables, norm_table)
                     if source_table not in diff_tables:
                         continue
 
-                    with open(Path(td, norm_table + "_ddl.sql"), "w") as fw:
-                        fw.write(tbl_ddl)
+                    ddl_files[source_table] = Path(td, norm_table + "_ddl.sql")
+                    with open(ddl_files[source_table], "w") as fw:
+                        fw.write(tbl_ddl.strip() + ";\n")
+
+        for source_table, tbl_ddl_file in ddl_files.items():  # In file order, with referenced tables first
+            if run_table_ddl(batch, jdbc, cfg, tbl_ddl_file, echo) == "Error":
+                error_table = source_table
+                error_ddl = tbl_ddl_file.read_text()
+                break
 
-                    gui.print_msg("Creating table '" + source_table + "':", style=gui.style.info, highlight=True)
+            gui.print_msg("Created table '" + source_table + "'", style=gui.style.info, highlight=True)
+            created.append(norm_tables[source_table])
 
-                    result = str(
-                        batch.runScript(" ".join((
-                            conn,
-                            "WbInclude",
-                            "-file=" + str(ddl_file),
-                            "-verbose=" + str(echo),
-                            "-printStatements=" + str(cfg.debug),
-                            "-encoding=UTF8;",
-                            "commit; WbDisconnect;",
-                        ))))
+    with cfg.config_db.conn:  # Update all created tables in one transaction
+        cfg.config_db.conn.executemany("UPDATE tables SET created = 1 WHERE norm_name = ?", [(x, ) for x in created])
 
-                    if str(result) == "Error":
-                        gui.print_msg(str(result), exit=True)
-                    else:
-                        cfg.config_db.execute("update tables set created = 1 where norm_name = '" + norm_table + "';")
+    if error_table:
+        gui.print_msg("Error creating table '" + error_table + "' with statement:\n" + error_ddl, exit=True)
 
 
 def get_connect_cmd(jdbc, cfg):
@@ -353,28 +313,3 @@ def run_copy_file(cfg, copy_file, diff_data):
         gui.print_msg("Errors on copying tables '" + ", ".join(error_tables) + "'", exit=True)
 
     return cp_result
-
-
-def export_text_columns(dbo, select, text_columns, tsv_path, cfg):
-    cmd = " ".join((
-        get_connect_cmd(dbo, cfg),
-        "WbExport",
-        "-type=text",
-        "-file=" + str(tsv_path),
-        "-continueOnError=false",
-        "-encoding=UTF8",
-        "-header=true",
-        "-decimal='.'",
-        "-maxDigits=0",
-        "-lineEnding=lf",
-        "-replaceExpression='(\\n|\\r\\n|\\r|\\t|\\x00)' -replaceWith=' '",
-        "-trimCharData=true",
-        "-nullString=''",
-        "-showProgress=100000;",
-        select,
-        "WbDisconnect;",
-    ))
-
-    batch = get_batch()
-
-    return str(batch.runScript(cmd))
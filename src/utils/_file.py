@@ -17,6 +17,7 @@ import blake3
 import hashlib
 import fileinput
 import os
+import stat
 import sys
 import subprocess
 from pathlib import Path
@@ -59,14 +60,66 @@ def xdg_open_file(filename):
         subprocess.call([opener, filename])
 
 
-def get_checksum(filename, blocksize=65536):
+MMAP_MIN_SIZE = 16 * 1024 * 1024  # Smaller files are hashed faster with plain reads on one thread
+
+
+def get_checksum(filename, blocksize=1024 * 1024, max_threads=blake3.blake3.AUTO):
+    """
+    Blake3 checksum of file. Large regular files are memory mapped and hashed on all cores,
+    other files (small, special or not mappable) with buffered reads.
+    """
+    st = os.stat(filename)
+    if stat.S_ISREG(st.st_mode) and st.st_size >= MMAP_MIN_SIZE:
+        try:
+            hash = blake3.blake3(max_threads=max_threads)
+            hash.update_mmap(filename)
+            return hash.hexdigest()
+        except (OSError, ValueError):
+            pass
+
     hash = blake3.blake3()
-    with open(filename, "rb") as f:
-        for block in iter(lambda: f.read(blocksize), b""):
-            hash.update(block)
+    buffer = bytearray(blocksize)
+    view = memoryview(buffer)
+    with open(filename, "rb", buffering=0) as f:
+        for size in iter(lambda: f.readinto(buffer), 0):
+            hash.update(view[:size])
     return hash.hexdigest()
 
 
+class HashWriter:
+    """
+    Binary file writer computing blake3 checksum of everything written
+    """
+
+    def __init__(self, filename, buffering=1024 * 1024):
+        self.file = open(filename, "wb", buffering=buffering)
+        self.hash = blake3.blake3()
+        self.size = 0
+
+    def write(self, data):
+        self.hash.update(data)
+        self.size += len(data)
+        return self.file.write(data)
+
+    def tell(self):
+        return self.size
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def hexdigest(self):
+        return self.hash.hexdigest()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
 def md5sum(filename, blocksize=65536):
     hash = hashlib.md5()
     with open(filename, "rb") as f:
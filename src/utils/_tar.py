@@ -0,0 +1,248 @@
+# Copyright (C) 2023 Morten Eek
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import re
+import glob
+import tarfile
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import blake3
+from utils import _file
+
+COPY_BUFSIZE = 1024 * 1024
+VOLUME_RE = re.compile(r"\.\d{3}\.tar$")  # <name>.001.tar etc. in volume set <name>.tar
+
+
+class HashReader:
+    """
+    Binary file reader computing blake3 checksum of everything read
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.hash = blake3.blake3()
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.hash.update(data)
+        return data
+
+    def hexdigest(self):
+        return self.hash.hexdigest()
+
+
+def scan_dir(path):
+    """
+    List one directory: (path, size, is_dir) per entry
+    """
+    entries = []
+    with os.scandir(path) as it:
+        for entry in it:
+            is_dir = entry.is_dir(follow_symlinks=False)
+            size = entry.stat(follow_symlinks=False).st_size if entry.is_file(follow_symlinks=False) else 0
+            entries.append((entry.path, size, is_dir))
+
+    return entries
+
+
+def scan_tree(root, jobs):
+    """
+    Walk directory tree with directories listed in parallel. Returns sorted (path, size, is_dir) per entry.
+    """
+    entries = [(str(root), 0, True)]
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        pending = {executor.submit(scan_dir, root)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for entry in future.result():
+                    entries.append(entry)
+                    if entry[2]:
+                        pending.add(executor.submit(scan_dir, entry[0]))
+
+    return sorted(entries)
+
+
+def split_volumes(entries, volume_size):
+    """
+    Split entries in volumes of max volume_size bytes (a bigger file gets a volume of its own)
+    """
+    if not volume_size:
+        return [entries]
+
+    volumes = [[]]
+    size = 0
+    for entry in entries:
+        if volumes[-1] and size + entry[1] > volume_size:
+            volumes.append([])
+            size = 0
+        volumes[-1].append(entry)
+        size += entry[1]
+
+    return volumes
+
+
+def get_volume_path(tar_path, volume, volume_count):
+    if volume_count == 1:
+        return Path(tar_path)
+
+    return Path(tar_path).with_suffix("." + str(volume).zfill(3) + ".tar")
+
+
+def get_volume_set_path(tar_path):
+    """
+    Get path of volume set (<name>.tar) a tar volume belongs to
+    """
+    tar_path = Path(tar_path)
+    match = VOLUME_RE.search(tar_path.name)
+    return tar_path.with_name(tar_path.name[:match.start()] + ".tar") if match else tar_path
+
+
+def get_volume_paths(set_path):
+    """
+    Get tar-files on disk of volume set in volume order
+    """
+    set_path = Path(set_path)
+    if set_path.is_file():
+        return [set_path]
+
+    return sorted(set_path.parent.glob(glob.escape(set_path.stem) + ".[0-9][0-9][0-9].tar"))
+
+
+def write_volume(tar_path, entries, base_dir):
+    """
+    Write tar volume, hashing volume and members while writing. Returns volume checksum and member index.
+    """
+    members = []
+    with _file.HashWriter(tar_path) as f:
+        with tarfile.open(fileobj=f, mode="w", format=tarfile.PAX_FORMAT, copybufsize=COPY_BUFSIZE) as archive:
+            for path, size, is_dir in entries:
+                tarinfo = archive.gettarinfo(path, arcname=os.path.relpath(path, base_dir))
+                header_offset = archive.offset
+                checksum = None
+                if tarinfo.isreg():
+                    with open(path, "rb") as src:
+                        reader = HashReader(src)
+                        archive.addfile(tarinfo, reader)
+                        checksum = reader.hexdigest()
+                else:
+                    archive.addfile(tarinfo)
+
+                padded_size = -(-tarinfo.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE if tarinfo.isreg() else 0
+                members.append({
+                    "member": tarinfo.name,
+                    "header_offset": header_offset,
+                    "offset": archive.offset - padded_size,  # Start of member data
+                    "size": tarinfo.size,
+                    "mtime": int(tarinfo.mtime),
+                    "checksum": checksum,
+                })
+
+    return f.hexdigest(), members
+
+
+def create_volumes(source, tar_path, jobs, volume_size=0):
+    """
+    Pack directory in one or more size bounded tar volumes created in parallel.
+    Returns (volume path, checksum, members) per volume.
+    """
+    volumes = split_volumes(scan_tree(source, jobs), volume_size)
+    base_dir = Path(source).parent
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(write_volume, get_volume_path(tar_path, idx + 1, len(volumes)), entries, base_dir)
+            for idx, entries in enumerate(volumes)
+        ]
+
+    return [(get_volume_path(tar_path, idx + 1, len(volumes)), *future.result()) for idx, future in enumerate(futures)]
+
+
+def read_member(f, member, chunk_size=COPY_BUFSIZE):
+    """
+    Stream data of one member by seeking straight to its offset
+    """
+    f.seek(member["offset"])
+    remaining = member["size"]
+    while remaining > 0:
+        chunk = f.read(min(chunk_size, remaining))
+        if not chunk:
+            raise EOFError("Unexpected end of tar-file in member '" + member["member"] + "'")
+        remaining -= len(chunk)
+        yield chunk
+
+
+def verify_member(f, member):
+    """
+    Compare checksum of member data with checksum in index
+    """
+    hash = blake3.blake3()
+    for chunk in read_member(f, member):
+        hash.update(chunk)
+
+    return hash.hexdigest() == member["checksum"]
+
+
+def is_extracted(member, dest_dir):
+    path = Path(dest_dir, member["member"])
+    if member["checksum"] is None:
+        return path.exists() or path.is_symlink()
+
+    st = os.lstat(path) if path.is_file() else None
+    return st is not None and st.st_size == member["size"] and int(st.st_mtime) == member["mtime"]
+
+
+def extract_member(archive, f, member, dest_dir):
+    """
+    Extract one member by offset, verifying checksum while writing. Returns False on checksum mismatch.
+    """
+    path = Path(dest_dir, member["member"])
+    if not path.resolve().is_relative_to(Path(dest_dir).resolve()):
+        raise ValueError("Member '" + member["member"] + "' outside of target directory")
+
+    if member["checksum"] is None:  # Directories, links etc. are extracted by tarfile from their header
+        archive.fileobj.seek(member["header_offset"])
+        archive.extract(tarfile.TarInfo.fromtarfile(archive), dest_dir)
+        return True
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    part_path = Path(str(path) + ".part")
+    hash = blake3.blake3()
+    with open(part_path, "wb") as out:
+        for chunk in read_member(f, member):
+            hash.update(chunk)
+            out.write(chunk)
+
+    if hash.hexdigest() != member["checksum"]:
+        part_path.unlink()
+        return False
+
+    os.replace(part_path, path)
+    os.utime(path, (member["mtime"], member["mtime"]))
+    return True
+
+
+def extract_members(tar_path, members, dest_dir):
+    """
+    Extract members not already extracted, in offset order. Returns names of members failing verification.
+    """
+    failed = []
+    with open(tar_path, "rb") as f, tarfile.open(tar_path, mode="r") as archive:
+        for member in sorted(members, key=lambda x: x["offset"]):
+            if not is_extracted(member, dest_dir) and not extract_member(archive, f, member, dest_dir):
+                failed.append(member["member"])
+
+    return failed
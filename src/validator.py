@@ -0,0 +1,198 @@
+# Copyright (C) 2023 Morten Eek
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import re
+import sqlite3
+from pathlib import Path
+from dataclasses import dataclass
+from datetime import date, datetime, time
+from decimal import Decimal, InvalidOperation
+
+MAX_ERRORS = 100  # Per table
+BOOLEAN_VALUES = ("true", "false", "True", "False", "TRUE", "FALSE", "1", "0")
+INTEGER_RE = re.compile(r"[+-]?\d+")
+
+
+def is_number(value):
+    try:
+        return Decimal(value).is_finite() and value.strip() == value
+    except InvalidOperation:
+        return False
+
+
+def is_iso(parse):
+
+    def _check(value):
+        try:
+            parse(value)
+            return True
+        except ValueError:
+            return False
+
+    return _check
+
+
+# Datapackage field type to check of tsv value (types not listed are not checked):
+TYPE_CHECKS = {
+    "integer": lambda value: INTEGER_RE.fullmatch(value) is not None,
+    "year": lambda value: INTEGER_RE.fullmatch(value) is not None,
+    "number": is_number,
+    "boolean": lambda value: value in BOOLEAN_VALUES,
+    "date": is_iso(date.fromisoformat),
+    "datetime": is_iso(datetime.fromisoformat),
+    "time": is_iso(time.fromisoformat),
+}
+
+
+@dataclass
+class TableSpec:
+    """
+    Picklable validation rules for one datapackage resource
+    """
+    name: str
+    fields: list  # (name, type, max_length, required, pattern) per field
+    primary_key: tuple
+    key_groups: list  # Field name tuples spilled to key store (primary key, foreign keys and referenced keys)
+    keys_path: Path
+
+
+def get_keys_dir(tmp_dir, source):
+    """
+    Key stores of one database source (named like its config database)
+    """
+    return Path(tmp_dir, "keys", Path(source).parent.name)
+
+
+def get_keys_path(keys_dir, table_name):
+    return Path(keys_dir, table_name + ".db")
+
+
+def get_key_table(key_group):
+    return "k_" + "__".join(key_group)
+
+
+def get_columns(key_group, alias=""):
+    return ", ".join(alias + '"' + x + '"' for x in key_group)
+
+
+def create_index(conn, key_group, schema="main"):
+    conn.execute("CREATE INDEX IF NOT EXISTS " + schema + '."i_' + get_key_table(key_group) + '" ON "' +
+                 get_key_table(key_group) + '" (' + get_columns(key_group) + ")")
+
+
+def get_table_spec(package, resource, keys_dir):
+    """
+    Get validation rules for resource from parsed datapackage
+    """
+    key_groups = []
+    if resource.schema.primary_key:
+        key_groups.append(tuple(resource.schema.primary_key))
+
+    for fk in resource.schema.foreign_keys:
+        key_groups.append(tuple(fk["fields"]))
+
+    for res in package.resources:  # Keys referenced by other tables
+        for fk in res.schema.foreign_keys:
+            if (fk["reference"]["resource"] or res.name) == resource.name:
+                key_groups.append(tuple(fk["reference"]["fields"]))
+
+    return TableSpec(
+        name=resource.name,
+        fields=[(field.name, field.type, field.constraints.get("maxLength"), field.required,
+                 field.constraints.get("pattern")) for field in resource.schema.fields],
+        primary_key=tuple(resource.schema.primary_key),
+        key_groups=list(dict.fromkeys(key_groups)),
+        keys_path=get_keys_path(keys_dir, resource.name),
+    )
+
+
+class TableValidator:
+    """
+    Validates tsv rows while they are written and spills key columns to a disk-backed key store
+    """
+
+    def __init__(self, spec, batch_size=10000):
+        self.spec = spec
+        self.batch_size = batch_size
+        self.errors = []
+        self.row_count = 0
+        self.checks = []
+        names = [field[0] for field in spec.fields]
+        for idx, (name, type, max_length, required, pattern) in enumerate(spec.fields):
+            self.checks.append((idx, name, TYPE_CHECKS.get(type), type, max_length, required,
+                                re.compile(pattern) if pattern else None))
+
+        self.key_indexes = [[names.index(name) for name in group] for group in spec.key_groups]
+        self.key_rows = [[] for _ in spec.key_groups]
+
+        spec.keys_path.parent.mkdir(parents=True, exist_ok=True)
+        spec.keys_path.unlink(missing_ok=True)
+        self.conn = sqlite3.connect(spec.keys_path)
+        self.conn.execute("PRAGMA journal_mode = OFF")
+        self.conn.execute("PRAGMA synchronous = OFF")
+        for group in spec.key_groups:
+            self.conn.execute('CREATE TABLE "' + get_key_table(group) + '" (' + get_columns(group) + ")")
+
+    def error(self, msg):
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(self.spec.name + ", row " + str(self.row_count) + ": " + msg)
+
+    def add_row(self, values):
+        self.row_count += 1
+        for idx, name, check, type, max_length, required, pattern in self.checks:
+            value = values[idx]
+            if value == "":
+                if required:
+                    self.error("missing value in required field '" + name + "'")
+                continue
+
+            if check and not check(value):
+                self.error("value '" + value[:50] + "' in field '" + name + "' is not of type " + type)
+            if max_length and len(value) > max_length:
+                self.error("value in field '" + name + "' longer than maxLength " + str(max_length))
+            if pattern and not pattern.fullmatch(value):
+                self.error("value '" + value[:50] + "' in field '" + name + "' does not match pattern")
+
+        for key_indexes, key_rows in zip(self.key_indexes, self.key_rows):
+            key = tuple(values[idx] for idx in key_indexes)
+            if all(key):  # Keys with null values are not checked
+                key_rows.append(key)
+
+        if self.row_count % self.batch_size == 0:
+            self.flush()
+
+    def flush(self):
+        for group, key_rows in zip(self.spec.key_groups, self.key_rows):
+            if key_rows:
+                self.conn.executemany(
+                    'INSERT INTO "' + get_key_table(group) + '" VALUES (' + ", ".join("?" for _ in group) + ")",
+                    key_rows)
+                key_rows.clear()
+
+    def close(self):
+        """
+        Check primary key uniqueness (and index it for foreign key checks). Returns list of errors.
+        """
+        self.flush()
+        if self.spec.primary_key:
+            create_index(self.conn, self.spec.primary_key)
+            columns = get_columns(self.spec.primary_key)
+            for row in self.conn.execute("SELECT " + columns + ' FROM "' + get_key_table(self.spec.primary_key) +
+                                         '" GROUP BY ' + columns + " HAVING count(*) > 1 LIMIT " + str(MAX_ERRORS)):
+                self.errors.append(self.spec.name + ": duplicate primary key " + str(row))
+
+        self.conn.commit()
+        self.conn.close()
+        return self.errors
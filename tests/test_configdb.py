@@ -0,0 +1,34 @@
+import os
+
+import blake3
+
+import configdb
+
+
+def test_checksum_cache_follows_moved_and_modified_files(tmp_path):
+    config_db = configdb.create_db(tmp_path / "config.db")
+    path = tmp_path / "a.bin"
+    path.write_bytes(b"first")
+    checksum = blake3.blake3(b"first").hexdigest()
+
+    assert configdb.get_checksum(config_db, path) == checksum
+    assert config_db["checksums"].count == 1
+
+    moved = tmp_path / "b.bin"
+    os.rename(path, moved)
+    assert configdb.get_checksum(config_db, moved) == checksum  # From cache, path updated
+    assert [row["path"] for row in config_db["checksums"].rows] == [str(moved)]
+
+    moved.write_bytes(b"second version")
+    assert configdb.get_checksum(config_db, moved) == blake3.blake3(b"second version").hexdigest()
+    assert config_db["checksums"].count == 1  # Outdated entry replaced
+
+
+def test_checksum_cache_used_without_rehashing(tmp_path):
+    config_db = configdb.create_db(tmp_path / "config.db")
+    path = tmp_path / "a.bin"
+    path.write_bytes(b"data")
+
+    configdb.set_checksum(config_db, path, "computed while written")
+
+    assert configdb.get_checksum(config_db, path) == "computed while written"
@@ -0,0 +1,147 @@
+import datetime
+import sqlite3
+import zipfile
+from types import SimpleNamespace
+
+import _sqlite
+
+
+def test_import_same_named_files_in_different_folders(tmp_path):
+    data_dir = tmp_path / "data"
+    (data_dir / "a").mkdir(parents=True)
+    (data_dir / "b").mkdir()
+    (data_dir / "a" / "data.csv").write_text("id,name\n1,x\n2,y\n", encoding="utf-8")
+    (data_dir / "b" / "data.csv").write_text("id,name,value\n1,x,10\n", encoding="utf-8")
+
+    args = SimpleNamespace(source_db_path=tmp_path / "source.db", data_files_dir=data_dir, tmp_dir=tmp_path, jobs=2)
+    _sqlite.import_files(args)
+
+    conn = sqlite3.connect(args.source_db_path)
+    tables = sorted(row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'"))
+    assert tables == ["data_1", "data_2"]
+    assert conn.execute("SELECT * FROM data_1").fetchall() == [("1", "x"), ("2", "y")]
+    assert conn.execute("SELECT * FROM data_2").fetchall() == [("1", "x", "10")]
+
+
+XLSX_FILES = {
+    "xl/workbook.xml": """<?xml version="1.0" encoding="UTF-8"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+          xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+  <sheets>
+    <sheet name="People" sheetId="1" r:id="rId1"/>
+    <sheet name="Empty" sheetId="2" r:id="rId2"/>
+  </sheets>
+</workbook>""",
+    "xl/_rels/workbook.xml.rels": """<?xml version="1.0" encoding="UTF-8"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+  <Relationship Id="rId1" Target="worksheets/sheet1.xml"/>
+  <Relationship Id="rId2" Target="/xl/worksheets/sheet2.xml"/>
+</Relationships>""",
+    "xl/sharedStrings.xml": """<?xml version="1.0" encoding="UTF-8"?>
+<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+  <si><t>name</t></si>
+  <si><t>born</t></si>
+  <si><r><t>Ada </t></r><r><t>Lovelace</t></r><rPh><t>phonetic</t></rPh></si>
+</sst>""",
+    "xl/styles.xml": """<?xml version="1.0" encoding="UTF-8"?>
+<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+  <numFmts>
+    <numFmt numFmtId="164" formatCode="dd\\.mm\\.yyyy"/>
+    <numFmt numFmtId="165" formatCode="0.00&quot;d&quot;"/>
+  </numFmts>
+  <cellXfs>
+    <xf numFmtId="0"/>
+    <xf numFmtId="164"/>
+    <xf numFmtId="165"/>
+    <xf numFmtId="14"/>
+  </cellXfs>
+</styleSheet>""",
+    "xl/worksheets/sheet1.xml": """<?xml version="1.0" encoding="UTF-8"?>
+<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+  <sheetData>
+    <row r="1"/>
+    <row r="2"><c r="A2" t="s"><v>0</v></c><c r="B2" t="s"><v>1</v></c>
+      <c r="D2" t="inlineStr"><is><t>ok</t></is></c></row>
+    <row r="3"><c r="A3" t="s"><v>2</v></c><c r="B3" s="1"><v>43831</v></c><c r="C3" s="2"><v>1.5</v></c>
+      <c r="D3" t="b"><v>1</v></c></row>
+    <row r="4"><c r="B4" s="3"><v>43831.5</v></c><c r="C4"><v>42</v></c></row>
+  </sheetData>
+</worksheet>""",
+    "xl/worksheets/sheet2.xml": """<?xml version="1.0" encoding="UTF-8"?>
+<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData/></worksheet>""",
+}
+
+ODS_CONTENT = """<?xml version="1.0" encoding="UTF-8"?>
+<office:document-content xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0"
+                         xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0"
+                         xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0">
+  <office:body><office:spreadsheet>
+    <table:table table:name="Sheet A">
+      <table:table-row table:number-rows-repeated="2"><table:table-cell/></table:table-row>
+      <table:table-row>
+        <table:table-cell office:value-type="string"><text:p>id</text:p></table:table-cell>
+        <table:table-cell table:number-columns-repeated="2"/>
+        <table:table-cell office:value-type="string"><text:p>a<text:s text:c="2"/>b</text:p></table:table-cell>
+      </table:table-row>
+      <table:table-row table:number-rows-repeated="2">
+        <table:table-cell office:value-type="float" office:value="1"/>
+        <table:table-cell office:value-type="date" office:date-value="2020-01-02"/>
+        <table:table-cell office:value-type="time" office:time-value="PT13H05M30S"/>
+        <table:table-cell office:value-type="boolean" office:boolean-value="true"/>
+      </table:table-row>
+      <table:table-row table:number-rows-repeated="3">
+        <table:table-cell table:number-columns-repeated="5"/>
+      </table:table-row>
+      <table:table-row>
+        <table:table-cell office:value-type="float" office:value="2.5"/>
+        <table:covered-table-cell table:number-columns-repeated="2"/>
+        <table:table-cell office:value-type="string"><text:p>x</text:p><text:p>y</text:p></table:table-cell>
+      </table:table-row>
+      <table:table-row table:number-rows-repeated="1048570"><table:table-cell table:number-columns-repeated="1024"/>
+      </table:table-row>
+    </table:table>
+    <table:table table:name="Blank">
+      <table:table-row table:number-rows-repeated="1048576"><table:table-cell/></table:table-row>
+    </table:table>
+  </office:spreadsheet></office:body>
+</office:document-content>"""
+
+
+def write_zip(path, files):
+    with zipfile.ZipFile(path, "w") as zf:
+        for name, content in files.items():
+            zf.writestr(name, content)
+
+    return path
+
+
+def test_read_excel_shared_strings_styles_and_gaps(tmp_path):
+    fil = write_zip(tmp_path / "people.xlsx", XLSX_FILES)
+
+    sheets = [(name, header, list(rows)) for name, header, rows in _sqlite.read_excel(fil, 3, tmp_path)]
+
+    assert [(name, header) for name, header, _ in sheets] == [("people_3", ["name", "born", None, "ok"])]
+    assert sheets[0][2] == [
+        ["Ada Lovelace", datetime.datetime(2020, 1, 1), 1.5, True],
+        [None, datetime.datetime(2020, 1, 1, 12), 42],
+    ]
+
+
+def test_read_excel_1904_date_system(tmp_path):
+    workbook = XLSX_FILES["xl/workbook.xml"].replace("<sheets>", '<workbookPr date1904="1"/><sheets>')
+    files = XLSX_FILES | {"xl/workbook.xml": workbook}
+    fil = write_zip(tmp_path / "people.xlsx", files)
+
+    rows = list(next(_sqlite.read_excel(fil, 1, tmp_path))[2])
+
+    assert rows[0][1] == datetime.datetime(2024, 1, 2)
+
+
+def test_read_ods_repeated_rows_and_cells(tmp_path):
+    fil = write_zip(tmp_path / "sheets.ods", {"content.xml": ODS_CONTENT})
+
+    sheets = [(name, header, list(rows)) for name, header, rows in _sqlite.read_ods(fil, 2, tmp_path)]
+
+    assert [(name, header) for name, header, _ in sheets] == [("sheet_a_2", ["id", None, None, "a  b"])]
+    row = [1, datetime.date(2020, 1, 2), datetime.time(13, 5, 30), True]
+    assert sheets[0][2] == [row, row, [], [], [], [2.5, None, None, "x\ny"]]
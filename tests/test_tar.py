@@ -0,0 +1,60 @@
+import os
+
+from utils import _tar
+
+
+def make_tree(root):
+    (root / "sub").mkdir(parents=True)
+    for idx in range(5):
+        (root / ("f" + str(idx) + ".bin")).write_bytes(os.urandom(3000 + idx * 700))
+    (root / "sub" / "empty.txt").write_bytes(b"")
+    (root / "sub" / "note.txt").write_text("hello", encoding="utf-8")
+
+
+def test_volume_member_index_round_trip(tmp_path):
+    source = tmp_path / "docs"
+    make_tree(source)
+    dest = tmp_path / "out"
+    dest.mkdir()
+
+    volumes = _tar.create_volumes(source, tmp_path / "docs.tar", 2, volume_size=8000)
+
+    assert len(volumes) > 1
+    assert [path.name for path, _, _ in volumes] == [path.name for path in _tar.get_volume_paths(tmp_path / "docs.tar")]
+    assert all(_tar.get_volume_set_path(path) == tmp_path / "docs.tar" for path, _, _ in volumes)
+
+    members = {}
+    for path, checksum, volume_members in volumes:
+        with open(path, "rb") as f:
+            assert all(_tar.verify_member(f, member) for member in volume_members if member["checksum"])
+        assert _tar.extract_members(path, volume_members, dest) == []
+        members[path] = volume_members
+
+    for path in source.rglob("*"):
+        extracted = dest / "docs" / path.relative_to(source)
+        assert extracted.is_dir() if path.is_dir() else extracted.read_bytes() == path.read_bytes()
+
+    (dest / "docs" / "f3.bin").unlink()
+    (dest / "docs" / "sub" / "note.txt").write_text("changed", encoding="utf-8")
+    for path, volume_members in members.items():
+        assert _tar.extract_members(path, volume_members, dest) == []
+
+    assert (dest / "docs" / "f3.bin").read_bytes() == (source / "f3.bin").read_bytes()
+    assert (dest / "docs" / "sub" / "note.txt").read_text(encoding="utf-8") == "hello"
+
+
+def test_extract_members_reports_checksum_mismatch(tmp_path):
+    source = tmp_path / "docs"
+    make_tree(source)
+    dest = tmp_path / "out"
+
+    [(path, _, members)] = _tar.create_volumes(source, tmp_path / "docs.tar", 1)
+    member = next(x for x in members if x["member"] == "docs/f2.bin")
+    with open(path, "r+b") as f:  # Corrupt member data in tar-file
+        f.seek(member["offset"] + 10)
+        f.write(bytes([f.read(1)[0] ^ 0xFF]))
+
+    assert _tar.extract_members(path, members, dest) == ["docs/f2.bin"]
+    assert not (dest / "docs" / "f2.bin").exists()
+    assert not (dest / "docs" / "f2.bin.part").exists()
+    assert (dest / "docs" / "f1.bin").read_bytes() == (source / "f1.bin").read_bytes()
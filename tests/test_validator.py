@@ -0,0 +1,83 @@
+import dp
+import fkcheck
+import validator
+
+PACKAGE = dp.parse_package({
+    "resources": [
+        {
+            "name": "parent",
+            "schema": {
+                "fields": [
+                    {"name": "id", "type": "integer", "constraints": {"required": True}},
+                    {"name": "code", "type": "string", "constraints": {"maxLength": 3}},
+                ],
+                "primaryKey": ["id"],
+            },
+        },
+        {
+            "name": "child",
+            "schema": {
+                "fields": [
+                    {"name": "id", "type": "integer"},
+                    {"name": "parent_id", "type": "integer"},
+                    {"name": "created", "type": "date"},
+                    {"name": "up_id", "type": "integer"},
+                ],
+                "primaryKey": ["id"],
+                "foreignKeys": [
+                    {"fields": ["parent_id"], "reference": {"resource": "parent", "fields": ["id"]}},
+                    {"fields": ["up_id"], "reference": {"resource": "", "fields": ["id"]}},
+                ],
+            },
+        },
+    ]
+})
+
+
+def export_keys(resource, rows, keys_dir):
+    table_validator = validator.TableValidator(validator.get_table_spec(PACKAGE, resource, keys_dir), batch_size=2)
+    for row in rows:
+        table_validator.add_row(row)
+
+    return table_validator.close()
+
+
+def test_table_validator_checks_fields_and_primary_key(tmp_path):
+    parent, child = PACKAGE.resources
+
+    errors = export_keys(parent, [["1", "abc"], ["2", "abcd"], ["2", ""], ["x", ""], ["", ""]], tmp_path)
+
+    assert errors == [
+        "parent, row 2: value in field 'code' longer than maxLength 3",
+        "parent, row 4: value 'x' in field 'id' is not of type integer",
+        "parent, row 5: missing value in required field 'id'",
+        "parent: duplicate primary key ('2',)",
+    ]
+    assert validator.get_table_spec(PACKAGE, child, tmp_path).key_groups == [("id", ), ("parent_id", ), ("up_id", )]
+
+
+def test_fkcheck_reports_missing_keys(tmp_path):
+    parent, child = PACKAGE.resources
+    export_keys(parent, [["1", "a"], ["2", "b"]], tmp_path)
+    rows = [["1", "1", "2020-01-01", ""], ["2", "5", "2020-13-01", "1"], ["3", "", "", "9"], ["4", "5", "", ""]]
+
+    errors = export_keys(child, rows, tmp_path)
+
+    assert errors == ["child, row 2: value '2020-13-01' in field 'created' is not of type date"]
+    assert fkcheck.check_table(child, tmp_path) == [
+        "Foreign key child(parent_id) -> parent(id): ('5',) not found",
+        "Foreign key child(up_id) -> child(id): ('9',) not found",
+    ]
+    assert fkcheck.check_table(child, tmp_path, max_violations=0) == [
+        "Foreign key child(parent_id) -> parent(id): more than 0 violations",
+        "Foreign key child(up_id) -> child(id): more than 0 violations",
+    ]
+
+
+def test_fkcheck_reports_referenced_table_not_exported(tmp_path):
+    child = PACKAGE.resources[1]
+    export_keys(child, [["1", "1", "", "1"]], tmp_path)
+
+    assert fkcheck.check_table(child, tmp_path) == [
+        "Foreign key child(parent_id) -> parent(id): keys of referenced table not exported"
+    ]